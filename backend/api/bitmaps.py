@@ -0,0 +1,181 @@
+"""Сжатые битовые карты множеств id по схеме Roaring.
+
+Множество делится на блоки по старшим 16 битам id. Блок хранится
+возрастающим массивом младших 16 бит (array('H')), пока в нём
+не больше ARRAY_MAX_SIZE значений, а более плотный блок - целым
+числом на 65536 бит. Размер карты растёт с числом id, а не с наибольшим
+id, поэтому редкий ингредиент занимает несколько байт при любом
+числе рецептов.
+
+Карты не изменяются после создания: операции возвращают новые карты,
+поэтому их можно читать из нескольких потоков без блокировок.
+"""
+import sys
+from array import array
+from collections import defaultdict
+
+# Наибольшее число значений в блоке-массиве: массив из 4096 значений
+# занимает столько же, сколько блок-число (8 КБ).
+ARRAY_MAX_SIZE = 4096
+
+if hasattr(int, 'bit_count'):
+    def popcount(value):
+        """Число установленных битов."""
+        return value.bit_count()
+else:
+    def popcount(value):
+        """Число установленных битов (int.bit_count - с Python 3.10)."""
+        return bin(value).count('1')
+
+
+def int_to_lows(bits):
+    """
+    Возвращает возрастающий список номеров установленных битов числа.
+
+    Число просматривается 64-битными словами, пустые слова
+    пропускаются, в непустых перебираются только установленные биты.
+    """
+    words = array('Q', bits.to_bytes(
+        (bits.bit_length() + 63) // 64 * 8, 'little'))
+    if sys.byteorder == 'big':
+        words.byteswap()
+    lows = []
+    for index, word in enumerate(words):
+        while word:
+            lowest = word & -word
+            lows.append(index * 64 + lowest.bit_length() - 1)
+            word ^= lowest
+    return lows
+
+
+def lows_to_int(lows):
+    """Собирает блок-число из номеров битов."""
+    bits = bytearray(8192)
+    for low in lows:
+        bits[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def make_container(lows):
+    """Блок из возрастающей последовательности младших битов id."""
+    if len(lows) > ARRAY_MAX_SIZE:
+        return lows_to_int(lows)
+    return array('H', lows)
+
+
+def container_len(container):
+    """Число id в блоке."""
+    if isinstance(container, int):
+        return popcount(container)
+    return len(container)
+
+
+def container_lows(container):
+    """Младшие биты id блока по возрастанию."""
+    if isinstance(container, int):
+        return int_to_lows(container)
+    return container
+
+
+def and_containers(first, second):
+    """Пересечение блоков или None, если оно пусто."""
+    if isinstance(first, int) and isinstance(second, int):
+        bits = first & second
+        if popcount(bits) > ARRAY_MAX_SIZE:
+            return bits
+        lows = int_to_lows(bits)
+    elif isinstance(second, int):
+        lows = [low for low in first if second >> low & 1]
+    elif isinstance(first, int):
+        lows = [low for low in second if first >> low & 1]
+    else:
+        lows = sorted(set(first).intersection(second))
+    return array('H', lows) if lows else None
+
+
+def or_containers(first, second):
+    """Объединение блоков."""
+    if isinstance(first, int) or isinstance(second, int):
+        # Блок-число плотнее любого массива, объединение тоже.
+        if not isinstance(first, int):
+            first = lows_to_int(first)
+        if not isinstance(second, int):
+            second = lows_to_int(second)
+        return first | second
+    return make_container(sorted(set(first).union(second)))
+
+
+class Bitmap:
+    """Неизменяемое множество неотрицательных целых id."""
+
+    __slots__ = ('containers',)
+
+    def __init__(self, containers=None):
+        self.containers = containers or {}
+
+    @classmethod
+    def from_ids(cls, ids):
+        """Собирает карту из последовательности id."""
+        blocks = defaultdict(set)
+        for pk in ids:
+            blocks[pk >> 16].add(pk & 0xFFFF)
+        return cls({
+            high: make_container(sorted(lows))
+            for high, lows in blocks.items()
+        })
+
+    def __bool__(self):
+        return bool(self.containers)
+
+    def __len__(self):
+        return sum(map(container_len, self.containers.values()))
+
+    def __iter__(self):
+        """Перебирает id по возрастанию."""
+        for high in sorted(self.containers):
+            base = high << 16
+            for low in container_lows(self.containers[high]):
+                yield base | low
+
+    def __and__(self, other):
+        containers = {}
+        for high in self.containers.keys() & other.containers.keys():
+            container = and_containers(
+                self.containers[high], other.containers[high])
+            if container is not None:
+                containers[high] = container
+        return Bitmap(containers)
+
+    def __or__(self, other):
+        containers = dict(self.containers)
+        for high, container in other.containers.items():
+            if high in containers:
+                container = or_containers(containers[high], container)
+            containers[high] = container
+        return Bitmap(containers)
+
+    def changed(self, added=(), removed=()):
+        """
+        Возвращает карту с добавленными id из added и без id из removed.
+
+        Пересобираются только блоки, которых касаются изменения.
+        """
+        changes = defaultdict(lambda: (set(), set()))
+        for pk in added:
+            changes[pk >> 16][0].add(pk & 0xFFFF)
+        for pk in removed:
+            changes[pk >> 16][1].add(pk & 0xFFFF)
+        containers = dict(self.containers)
+        for high, (added_lows, removed_lows) in changes.items():
+            lows = set(container_lows(containers.pop(high, ())))
+            lows = (lows - removed_lows) | added_lows
+            if lows:
+                containers[high] = make_container(sorted(lows))
+        return Bitmap(containers)
+
+    def to_ids(self):
+        """Возрастающий список id."""
+        return list(self)
+
+
+EMPTY = Bitmap()
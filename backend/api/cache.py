@@ -0,0 +1,69 @@
+"""Версии данных для инвалидации кэшей API.
+
+Версия хранится в отдельном общем кэше versions (см. CACHES
+в настройках) и меняется при каждой записи в данные,
+от которых зависит закэшированный результат. Ключи кэша включают
+версии, поэтому устаревшие записи просто перестают читаться
+и вытесняются по таймауту.
+
+Версия меняется только после фиксации транзакции: иначе параллельный
+запрос мог бы прочитать из БД ещё не изменённые данные и сохранить
+их в кэше под новой версией.
+"""
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.connection import ConnectionProxy
+
+VERSIONS_CACHE_ALIAS = 'versions'
+
+# Кэш версий; как и django.core.cache.cache, свой для каждого потока.
+version_cache = ConnectionProxy(caches, VERSIONS_CACHE_ALIAS)
+
+
+def version_key(name, pk=None):
+    """Возвращает ключ кэша для версии name (или объекта name:pk)."""
+    if pk is None:
+        return f'version:{name}'
+    return f'version:{name}:{pk}'
+
+
+def get_versions(keys):
+    """
+    Возвращает словарь {ключ: версия} для ключей из version_key.
+
+    Отсутствующая версия (новая или вытесненная из кэша) инициализируется
+    текущим временем, поэтому после вытеснения версия никогда
+    не возвращается к старому значению.
+    """
+    keys = list(keys)
+    versions = version_cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            version_cache.add(key, now, None)
+        versions.update(version_cache.get_many(missing))
+    return versions
+
+
+def get_version(name, pk=None):
+    """Возвращает текущую версию name (или объекта name:pk)."""
+    key = version_key(name, pk)
+    return get_versions([key])[key]
+
+
+def bump_version(name, pk=None):
+    """
+    Меняет версию name (или объекта name:pk) после фиксации текущей
+    транзакции; вне транзакции - сразу.
+    """
+    key = version_key(name, pk)
+    transaction.on_commit(
+        lambda: version_cache.set(key, time.time_ns(), None))
+
+
+def table_version_name(db_table):
+    """Имя версии таблицы БД, меняющейся при любой записи в неё."""
+    return f'table:{db_table}'
@@ -0,0 +1,113 @@
+"""Готовые ответы для справочников тегов и ингредиентов.
+
+Полный список справочника сериализуется один раз на версию таблицы
+и хранится в памяти процесса в виде байтов вместе со сжатыми
+вариантами (gzip и, если установлен пакет Brotli, br).
+"""
+import gzip
+from collections import namedtuple
+from threading import Lock
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from api.cache import get_version, table_version_name
+from api.renderers import JSONRenderer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CatalogBody = namedtuple(
+    'CatalogBody', ('version', 'etag', 'identity', 'gzip', 'br'))
+
+_bodies = {}
+_lock = Lock()
+
+
+def get_catalog_body(queryset, serializer_class):
+    """
+    Возвращает тело ответа справочника для текущей версии таблицы.
+
+    При смене версии (любой записи в таблицу) тело пересобирается.
+    """
+    model = queryset.model
+    version = get_version(table_version_name(model._meta.db_table))
+    body = _bodies.get(model)
+    if body is not None and body.version == version:
+        return body
+    with _lock:
+        body = _bodies.get(model)
+        if body is None or body.version != version:
+            content = JSONRenderer().render(
+                serializer_class(queryset.all(), many=True).data)
+            body = CatalogBody(
+                version=version,
+                etag=f'"{model._meta.model_name}-{version}"',
+                identity=content,
+                gzip=gzip.compress(content, compresslevel=9),
+                br=brotli.compress(content) if brotli else None,
+            )
+            _bodies[model] = body
+    return body
+
+
+def parse_accept_encoding(header):
+    """Возвращает словарь {кодирование: q} из заголовка Accept-Encoding."""
+    weights = {}
+    for item in header.split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    return weights
+
+
+def choose_encoding(header, encodings):
+    """
+    Выбирает из encodings (в порядке предпочтения) кодирование
+    с наибольшим q > 0 или None, если лучше отдать тело без сжатия.
+
+    Кодирования, не названные в заголовке, получают q из "*".
+    Тело без сжатия отдаётся и тогда, когда подходящих кодирований нет,
+    но предпочитается сжатию, только если его q (или q у "*") выше.
+    """
+    weights = parse_accept_encoding(header)
+    default = weights.get('*', 0.0)
+    best, best_weight = None, weights.get('identity', default)
+    for encoding in reversed(encodings):
+        weight = weights.get(encoding, default)
+        if weight > 0 and weight >= best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def catalog_response(request, queryset, serializer_class):
+    """
+    Отдаёт справочник из памяти с учётом Accept-Encoding и If-None-Match.
+    """
+    body = get_catalog_body(queryset, serializer_class)
+    response = get_conditional_response(request, etag=body.etag)
+    if response is None:
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+            ('br', 'gzip') if body.br is not None else ('gzip',))
+        if encoding is None:
+            response = HttpResponse(body.identity)
+        else:
+            response = HttpResponse(getattr(body, encoding))
+            response['Content-Encoding'] = encoding
+        response['Content-Type'] = 'application/json'
+    response['ETag'] = body.etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
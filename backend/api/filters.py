@@ -1,13 +1,43 @@
-from recipes.models import Recipe, Ingredient, Tag
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, FloatField
+from django.db.models.expressions import Expression, RawSQL
+
+from api.indexes import ingredient_recipe_index
+from recipes.models import Recipe, Ingredient, IngredientRecipe, Tag
 
 from django_filters.rest_framework import (
     FilterSet,
+    BaseInFilter,
     CharFilter,
     BooleanFilter,
+    NumberFilter,
     ModelMultipleChoiceFilter
 )
 
 
+class NumberInFilter(BaseInFilter, NumberFilter):
+    """Фильтр по списку чисел через запятую: ?param=1,2,3."""
+
+
+class BaseTableSQL(Expression):
+    """
+    Фрагмент SQL, ссылающийся на основную таблицу запроса.
+
+    {table} в sql заменяется псевдонимом этой таблицы в компилируемом
+    запросе, поэтому выражение работает и во вложенных запросах,
+    например при подсчёте числа рецептов для пагинации.
+    """
+
+    def __init__(self, sql, params, output_field):
+        super().__init__(output_field=output_field)
+        self.sql, self.params = sql, tuple(params)
+
+    def as_sql(self, compiler, connection):
+        table = compiler.quote_name_unless_alias(compiler.query.base_table)
+        return self.sql.format(table=table), self.params
+
+
 class RecipeFilter(FilterSet):
     """
     Фильтр для модели Recipe.
@@ -16,6 +46,9 @@ class RecipeFilter(FilterSet):
     - is_in_shopping_cart: наличие рецепта в корзине покупок
     - is_favorited: наличие рецепта в избранном
     - tags: фильтрация по тегам
+    - search: полнотекстовый поиск по названию и описанию
+    - ingredients: рецепты, содержащие все перечисленные ингредиенты
+    - exclude_ingredients: рецепты без перечисленных ингредиентов
     """
     is_in_shopping_cart = BooleanFilter(method='filter_is_in_shopping_cart')
     is_favorited = BooleanFilter(method='filter_is_favorited')
@@ -23,11 +56,15 @@ class RecipeFilter(FilterSet):
                                      queryset=Tag.objects.all(),
                                      to_field_name='slug',
                                      )
+    search = CharFilter(method='filter_search')
+    ingredients = NumberInFilter(method='filter_ingredients')
+    exclude_ingredients = NumberInFilter(method='filter_exclude_ingredients')
 
     class Meta:
 
         model = Recipe
-        fields = ('is_in_shopping_cart', 'is_favorited', 'author', 'tags')
+        fields = ('is_in_shopping_cart', 'is_favorited', 'author', 'tags',
+                  'search', 'ingredients', 'exclude_ingredients')
 
     def filter_is_favorited(self, queryset, name, value):
         """
@@ -55,6 +92,88 @@ class RecipeFilter(FilterSet):
             return queryset.filter(cart_set__user=user)
         return queryset
 
+    def filter_ingredients(self, queryset, name, value):
+        """
+        Оставляет рецепты, содержащие все ингредиенты из value.
+
+        Множество рецептов вычисляется пересечением в инвертированном
+        индексе ingredient_recipe_index, в БД уходит только условие по id.
+        Если рецептов больше INGREDIENT_FILTER_MAX_IDS, условие строится
+        подзапросами по каждому ингредиенту.
+        """
+        if not value:
+            return queryset
+        ids = ingredient_recipe_index.recipes_with_all(
+            value, settings.INGREDIENT_FILTER_MAX_IDS)
+        if ids is not None:
+            return queryset.filter(id__in=ids)
+        for ingredient_id in set(value):
+            queryset = queryset.filter(id__in=IngredientRecipe.objects.filter(
+                ingredient_id=ingredient_id).values('recipe_id'))
+        return queryset
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        """
+        Исключает рецепты, содержащие хотя бы один ингредиент из value.
+
+        Как и в filter_ingredients, большое множество рецептов
+        заменяется подзапросом.
+        """
+        if not value:
+            return queryset
+        ids = ingredient_recipe_index.recipes_with_any(
+            value, settings.INGREDIENT_FILTER_MAX_IDS)
+        if ids is None:
+            ids = IngredientRecipe.objects.filter(
+                ingredient_id__in=set(value)).values('recipe_id')
+        return queryset.exclude(id__in=ids)
+
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск рецептов по названию и описанию.
+
+        На PostgreSQL используется генерируемый столбец search_vector
+        (русская морфология, GIN-индекс) и запрос в синтаксисе
+        websearch, на SQLite - таблица FTS5 recipes_recipe_fts
+        (см. миграцию recipes 0004). Найденные рецепты упорядочиваются
+        по релевантности search_rank.
+        """
+        if not value.strip():
+            return queryset
+        vendor = connections[queryset.db].vendor
+        if vendor == 'postgresql':
+            # Модуль импортирует psycopg2, поэтому загружается
+            # только при работе с PostgreSQL.
+            from django.contrib.postgres.search import (
+                SearchQuery, SearchRank, SearchVectorField
+            )
+            query = SearchQuery(value, search_type='websearch',
+                                config='russian')
+            queryset = queryset.alias(search_vector=BaseTableSQL(
+                '{table}.search_vector', (), SearchVectorField())
+            ).filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query))
+        elif vendor == 'sqlite':
+            match = self.fts5_query(value)
+            fts_table = f'{Recipe._meta.db_table}_fts'
+            queryset = queryset.filter(id__in=RawSQL(
+                f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s',
+                (match,))
+            ).annotate(search_rank=BaseTableSQL(
+                f'(SELECT -bm25({fts_table}) FROM {fts_table} '
+                f'WHERE {fts_table} MATCH %s AND rowid = {{table}}.id)',
+                (match,), FloatField()))
+        else:
+            return queryset.filter(name__icontains=value)
+        return queryset.order_by('-search_rank', *Recipe._meta.ordering)
+
+    @staticmethod
+    def fts5_query(value):
+        """Запрос FTS5: все слова как префиксы, спецсимволы экранированы."""
+        return ' '.join(
+            '"{}"*'.format(word.replace('"', '""')) for word in value.split()
+        )
+
 
 class IngredientFilter(FilterSet):
     """Фильтр для модели Ingredient."""
@@ -0,0 +1,214 @@
+"""Разбор изображений, присланных в виде data URI base64.
+
+Заголовок data URI и оценка размера проверяются до декодирования,
+base64 декодируется порциями без промежуточных копий всей строки,
+а размеры в пикселях читаются из заголовка файла без декодирования
+растра. Перекодирование в JPEG ограниченного размера выполняется
+в пуле процессов, поэтому большие загрузки не раздувают память
+воркеров gunicorn. При IMAGE_WORKERS = 0 изображение обрабатывается
+в текущем процессе.
+
+Для сохранённых изображений в том же пуле строятся миниатюры
+фиксированных ширин в JPEG и WebP. Имена миниатюр выводятся из имени
+исходного файла, поэтому их адреса формируются без обращения к БД
+и хранилищу.
+
+Файлы изображений именуются по содержимому и могут быть общими
+для нескольких записей (см. foodgram_backend.storage), поэтому файл
+и его миниатюры удаляются только после того, как на него
+не осталось ссылок.
+"""
+import binascii
+import re
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from api.pools import BoundedPool
+from recipes.images import (
+    THUMBNAIL_FORMATS, make_thumbnails, normalize_image, thumbnail_name
+)
+
+DATA_URI_HEADER = re.compile(
+    r'data:image/(?P<format>jpeg|jpg|png|gif|webp);base64,')
+# Наибольшая длина заголовка data URI, символов.
+DATA_URI_HEADER_MAX_LENGTH = 32
+# Форматы, которые Pillow может определить по содержимому файла.
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# Размер порции base64, символов.
+DECODE_CHUNK_SIZE = 256 * 1024
+# Пробельные символы, допустимые внутри base64 (переносы строк MIME).
+BASE64_WHITESPACE = re.compile(r'\s+')
+
+
+class ImageProcessingUnavailable(APIException):
+    """Пул обработки изображений перегружен или не уложился в таймаут."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Не удалось обработать изображение, попробуйте позже.'
+    default_code = 'image_processing_unavailable'
+
+
+pool = BoundedPool('IMAGE', ImageProcessingUnavailable)
+
+
+def decode_data_uri(data):
+    """
+    Декодирует data URI изображения и возвращает его байты.
+
+    Строка отклоняется до декодирования, если у неё неподходящий
+    заголовок или содержимое больше IMAGE_UPLOAD_MAX_BYTES.
+    """
+    match = DATA_URI_HEADER.match(data[:DATA_URI_HEADER_MAX_LENGTH])
+    if match is None:
+        raise serializers.ValidationError(
+            'Ожидается изображение JPEG, PNG, GIF или WEBP в base64.')
+    start = match.end()
+    if (len(data) - start) // 4 * 3 > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise serializers.ValidationError(
+            'Размер изображения не должен превышать '
+            f'{settings.IMAGE_UPLOAD_MAX_BYTES // (1024 * 1024)} МБ.')
+    buffer = BytesIO()
+    # Порция без пробелов может не делиться на 4: остаток декодируется
+    # вместе со следующей порцией.
+    rest = ''
+    try:
+        for offset in range(start, len(data), DECODE_CHUNK_SIZE):
+            chunk = rest + BASE64_WHITESPACE.sub(
+                '', data[offset:offset + DECODE_CHUNK_SIZE])
+            end = len(chunk) - len(chunk) % 4
+            buffer.write(binascii.a2b_base64(chunk[:end]))
+            rest = chunk[end:]
+        buffer.write(binascii.a2b_base64(rest))
+    except (binascii.Error, ValueError):
+        raise serializers.ValidationError('Некорректные данные base64.')
+    return buffer.getvalue()
+
+
+def check_image(content):
+    """
+    Проверяет формат и размеры изображения по заголовку файла.
+
+    Растр не декодируется; изображения больше IMAGE_UPLOAD_MAX_PIXELS
+    пикселей отклоняются.
+    """
+    try:
+        with Image.open(BytesIO(content)) as image:
+            image_format = image.format
+            width, height = image.size
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise serializers.ValidationError(
+            'Загрузите корректное изображение.')
+    if image_format not in IMAGE_FORMATS:
+        raise serializers.ValidationError(
+            'Ожидается изображение JPEG, PNG, GIF или WEBP.')
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise serializers.ValidationError(
+            'Разрешение изображения слишком велико.')
+
+
+def process_data_uri(data):
+    """
+    Возвращает байты JPEG, полученные из data URI изображения.
+
+    Изображение проверяется в текущем процессе, а перекодируется
+    в пуле; некорректное изображение приводит к ValidationError,
+    перегруженный пул - к ImageProcessingUnavailable (ответ 503).
+    """
+    content = decode_data_uri(data)
+    check_image(content)
+    try:
+        return pool.run(normalize_image, content)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise serializers.ValidationError(
+            'Загрузите корректное изображение.')
+
+
+def thumbnails_ready(storage, name, widths):
+    """
+    Проверяет, что миниатюры файла изображения name сохранены.
+
+    Миниатюра наибольшей ширины в WebP сохраняется последней,
+    поэтому её наличие означает, что готовы все миниатюры.
+    """
+    return storage.exists(thumbnail_name(name, widths[-1], 'webp'))
+
+
+def save_thumbnails(storage, name, widths, thumbnails=None):
+    """
+    Сохраняет миниатюры файла изображения name, если их ещё нет.
+
+    thumbnails - уже построенные миниатюры (см. make_thumbnails);
+    если они не переданы, строятся в пуле. При перегруженном пуле
+    поднимается ImageProcessingUnavailable, а миниатюры достраивает
+    команда generate_thumbnails.
+
+    Возвращает True, если миниатюры сохранены.
+    """
+    if not name:
+        return False
+    if thumbnails is None:
+        if thumbnails_ready(storage, name, widths):
+            return False
+        with storage.open(name) as file:
+            data = file.read()
+        thumbnails = pool.run(make_thumbnails, data, widths)
+    last = (widths[-1], 'webp')
+    for width, extension in sorted(thumbnails, key=lambda key: key == last):
+        path = thumbnail_name(name, width, extension)
+        if storage.exists(path):
+            storage.delete(path)
+        storage.save(path, ContentFile(thumbnails[width, extension]))
+    return True
+
+
+def delete_thumbnails(storage, name, widths):
+    """Удаляет миниатюры файла изображения name."""
+    for width in widths:
+        for extension in THUMBNAIL_FORMATS:
+            storage.delete(thumbnail_name(name, width, extension))
+
+
+def thumbnail_srcset(request, storage, name, widths):
+    """
+    Возвращает srcset миниатюр изображения по форматам:
+    {'jpg': 'url 100w, ...', 'webp': ...} или None, если изображения
+    нет или его миниатюры ещё не построены.
+    """
+    if not name or not thumbnails_ready(storage, name, widths):
+        return None
+    return {
+        extension: ', '.join(
+            '{} {}w'.format(request.build_absolute_uri(
+                storage.url(thumbnail_name(name, width, extension))), width)
+            for width in widths
+        )
+        for extension in THUMBNAIL_FORMATS
+    }
+
+
+def release_image(model, field, name, widths):
+    """
+    Удаляет файл изображения и его миниатюры, если ни одна запись
+    model больше не ссылается на него в поле field.
+
+    Проверка и удаление выполняются под блокировкой хранилища.
+    Файл, сохранённый или повторно использованный недавно, не удаляется:
+    ссылка на него может быть ещё не зафиксирована в БД. Такие файлы
+    удаляет команда delete_unused_images.
+
+    Возвращает True, если файл удалён.
+    """
+    if not name:
+        return False
+    storage = model._meta.get_field(field).storage
+    with storage.lock():
+        if (storage.recently_saved(name)
+                or model._default_manager.filter(**{field: name}).exists()):
+            return False
+        delete_thumbnails(storage, name, widths)
+        storage.delete(name)
+    return True
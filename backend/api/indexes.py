@@ -0,0 +1,250 @@
+"""Индексы в памяти процесса для быстрых выборок без обращения к БД."""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock, local
+
+from django.db import transaction
+
+from api.bitmaps import EMPTY, Bitmap
+from api.cache import (
+    bump_version, get_version, table_version_name, version_cache, version_key
+)
+from recipes.models import Ingredient, IngredientRecipe
+
+
+class IngredientPrefixIndex:
+    """Отсортированный индекс названий ингредиентов для автодополнения.
+
+    Названия приводятся к casefold, поэтому поиск по префиксу
+    регистронезависим и для кириллицы. Индекс загружается один раз
+    на процесс и перестраивается при смене версии таблицы ингредиентов.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.data = ([], [])
+        self.lock = Lock()
+
+    def refresh(self):
+        """Перестраивает индекс, если таблица ингредиентов изменилась."""
+        version = get_version(table_version_name(Ingredient._meta.db_table))
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            entries = sorted(
+                (name.casefold(), name, pk, unit)
+                for pk, name, unit in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit')
+            )
+            self.data = (
+                [entry[0] for entry in entries],
+                [{'id': pk, 'name': name, 'measurement_unit': unit}
+                 for _, name, pk, unit in entries],
+            )
+            self.version = version
+
+    def search(self, prefix, limit):
+        """Возвращает до limit ингредиентов, название которых
+           начинается с prefix."""
+        self.refresh()
+        keys, rows = self.data
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        result = []
+        for position in range(start, min(start + limit, len(keys))):
+            if not keys[position].startswith(prefix):
+                break
+            result.append(rows[position])
+        return result
+
+
+ingredient_prefix_index = IngredientPrefixIndex()
+
+
+class IngredientRecipeIndex:
+    """Инвертированный индекс "ингредиент -> рецепты".
+
+    Для каждого ингредиента хранится сжатая битовая карта id рецептов
+    (см. api.bitmaps), поэтому условия "все из" и "хотя бы один из"
+    вычисляются пересечением и объединением карт без соединений в БД.
+
+    Изменения ингредиентов рецептов записываются после фиксации
+    транзакции в журнал в общем кэше: каждый процесс перечитывает
+    из БД только строки изменённых рецептов. Индекс перестраивается
+    целиком, только если журнал не связан с версией индекса процесса
+    (вытеснен из кэша, переполнен или сброшен через invalidate).
+    """
+    version_name = 'index:ingredient_recipe'
+    journal_key = 'index:ingredient_recipe:journal'
+    lock_key = 'index:ingredient_recipe:lock'
+    # Число записей журнала и рецептов, после которого индекс
+    # выгоднее перестроить целиком.
+    journal_size = 256
+    max_delta_recipes = 1000
+    # Ожидание блокировки журнала, секунды.
+    lock_timeout = 5
+    lock_attempts = 20
+    lock_delay = 0.005
+
+    def __init__(self):
+        self.version = None
+        self.bitmaps = {}
+        self.recipe_ingredients = {}
+        self.lock = Lock()
+        self.local = local()
+
+    def refresh(self):
+        """Применяет к индексу изменения, сделанные после его загрузки."""
+        version = get_version(self.version_name)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            journal = version_cache.get(self.journal_key) or []
+            versions = [entry_version for entry_version, _ in journal]
+            changed = set()
+            if self.version in versions and versions[-1] == version:
+                for _, recipe_ids in journal[
+                        versions.index(self.version) + 1:]:
+                    changed.update(recipe_ids)
+            if changed and len(changed) <= self.max_delta_recipes:
+                self.apply(changed)
+            else:
+                self.rebuild()
+            self.version = version
+
+    def rebuild(self):
+        """Загружает индекс из всех связей рецептов с ингредиентами."""
+        recipes = defaultdict(list)
+        recipe_ingredients = defaultdict(set)
+        for ingredient_id, recipe_id in (
+            IngredientRecipe.objects.values_list(
+                'ingredient_id', 'recipe_id').iterator()
+        ):
+            recipes[ingredient_id].append(recipe_id)
+            recipe_ingredients[recipe_id].add(ingredient_id)
+        self.bitmaps = {
+            ingredient_id: Bitmap.from_ids(recipe_ids)
+            for ingredient_id, recipe_ids in recipes.items()
+        }
+        self.recipe_ingredients = recipe_ingredients
+
+    def apply(self, recipe_ids):
+        """Перечитывает из БД ингредиенты рецептов recipe_ids."""
+        rows = IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id')
+        removed, added = defaultdict(set), defaultdict(set)
+        for recipe_id in recipe_ids:
+            for ingredient_id in self.recipe_ingredients.pop(recipe_id, ()):
+                removed[ingredient_id].add(recipe_id)
+        for recipe_id, ingredient_id in rows:
+            added[ingredient_id].add(recipe_id)
+            self.recipe_ingredients.setdefault(
+                recipe_id, set()).add(ingredient_id)
+        # Карты заменяются новым словарём, поэтому запросы, читающие
+        # индекс без блокировки, не видят частично применённых изменений.
+        bitmaps = dict(self.bitmaps)
+        for ingredient_id in removed.keys() | added.keys():
+            bitmap = bitmaps.pop(ingredient_id, EMPTY).changed(
+                added[ingredient_id], removed[ingredient_id])
+            if bitmap:
+                bitmaps[ingredient_id] = bitmap
+        self.bitmaps = bitmaps
+
+    def recipes_changed(self, recipe_ids):
+        """
+        Отмечает изменение ингредиентов рецептов recipe_ids.
+
+        Рецепты накапливаются до фиксации транзакции и записываются
+        в журнал одной записью. Вне транзакции накопленное ранее
+        осталось от отменённых транзакций и сбрасывается.
+        """
+        if not transaction.get_connection().in_atomic_block:
+            self.reset()
+        pending = getattr(self.local, 'pending', None)
+        if pending is None:
+            pending = self.local.pending = set()
+        pending.update(recipe_ids)
+        transaction.on_commit(self.flush)
+
+    def reset(self):
+        """
+        Забывает рецепты, отмеченные в отменённых транзакциях потока.
+
+        В Django нет обработчиков отката, поэтому сброс выполняется
+        в начале запроса и вне транзакций.
+        """
+        self.local.pending = set()
+
+    def flush(self):
+        """Записывает накопленные рецепты в журнал."""
+        pending = getattr(self.local, 'pending', None)
+        if not pending:
+            return
+        self.local.pending = set()
+        version = time.time_ns()
+        if not self.acquire_journal():
+            # Без записи в журнале все процессы перестроят индекс.
+            version_cache.set(version_key(self.version_name), version, None)
+            return
+        try:
+            journal = version_cache.get(self.journal_key) or []
+            journal = journal[-(self.journal_size - 1):]
+            journal.append((version, sorted(pending)))
+            version_cache.set(self.journal_key, journal, None)
+            version_cache.set(version_key(self.version_name), version, None)
+        finally:
+            version_cache.delete(self.lock_key)
+
+    def acquire_journal(self):
+        """Захватывает блокировку журнала в общем кэше."""
+        for _ in range(self.lock_attempts):
+            if version_cache.add(self.lock_key, True, self.lock_timeout):
+                return True
+            time.sleep(self.lock_delay)
+        return False
+
+    def invalidate(self):
+        """Перестраивает индекс во всех процессах, например после импорта."""
+        bump_version(self.version_name)
+
+    def limited_ids(self, bitmap, limit):
+        """Список id из карты или None, если их больше limit."""
+        if len(bitmap) > limit:
+            return None
+        return bitmap.to_ids()
+
+    def recipes_with_all(self, ingredient_ids, limit):
+        """
+        Рецепты, содержащие все перечисленные ингредиенты,
+        или None, если их больше limit.
+        """
+        self.refresh()
+        bitmaps = self.bitmaps
+        result = None
+        for ingredient_id in set(ingredient_ids):
+            bitmap = bitmaps.get(ingredient_id, EMPTY)
+            result = bitmap if result is None else result & bitmap
+            if not result:
+                break
+        return self.limited_ids(result or EMPTY, limit)
+
+    def recipes_with_any(self, ingredient_ids, limit):
+        """
+        Рецепты, содержащие хотя бы один из перечисленных ингредиентов,
+        или None, если их больше limit.
+        """
+        self.refresh()
+        bitmaps = self.bitmaps
+        result = EMPTY
+        for ingredient_id in set(ingredient_ids):
+            result |= bitmaps.get(ingredient_id, EMPTY)
+        return self.limited_ids(result, limit)
+
+
+ingredient_recipe_index = IngredientRecipeIndex()
@@ -1,4 +1,91 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import partial
+from hashlib import md5
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import (
+    EmptyResultSet, FieldDoesNotExist, ValidationError
+)
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.cache import get_versions, table_version_name, version_key
+
+
+class CachedCountPaginator(DjangoPaginator):
+    """Paginator Django с кэшируемым и, при необходимости, оценочным COUNT.
+
+    Ключ кэша строится по SQL и параметрам запроса (то есть по набору
+    фильтров и пользователю, если запрос от него зависит) и по версиям
+    всех таблиц, упомянутых в запросе. Любая запись в эти таблицы меняет
+    версию, и счётчик пересчитывается.
+
+    Если задан estimate_threshold и БД - PostgreSQL, сначала берётся
+    оценка планировщика; при оценке не ниже порога она возвращается
+    вместо точного COUNT, а count_exact становится False.
+    """
+
+    def __init__(self, *args, cache_timeout=None, estimate_threshold=None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_timeout = cache_timeout
+        self.estimate_threshold = estimate_threshold
+        self.count_exact = True
+
+    @cached_property
+    def count(self):
+        if not self.cache_timeout:
+            self.count_exact, count = self.compute_count()
+            return count
+        try:
+            key = self.get_count_cache_key()
+        except EmptyResultSet:
+            return 0
+        cached = cache.get(key)
+        if cached is None:
+            cached = self.compute_count()
+            cache.set(key, cached, self.cache_timeout)
+        self.count_exact, count = cached
+        return count
+
+    def compute_count(self):
+        """Возвращает пару (точность, количество)."""
+        if self.estimate_threshold is not None:
+            estimate = self.estimate_count()
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return False, estimate
+        return True, self.object_list.count()
+
+    def estimate_count(self):
+        """Оценка числа строк по плану запроса PostgreSQL."""
+        queryset = self.object_list
+        if connections[queryset.db].vendor != 'postgresql':
+            return None
+        plan = json.loads(queryset.explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def get_count_cache_key(self):
+        query = self.object_list.query
+        sql, params = query.sql_with_params()
+        tables = sorted(
+            model._meta.db_table for model in apps.get_models()
+            if f'"{model._meta.db_table}"' in sql
+        )
+        versions = get_versions(
+            version_key(table_version_name(table)) for table in tables)
+        digest = md5(
+            repr((sql, params, sorted(versions.items()))).encode('utf-8')
+        ).hexdigest()
+        return f'count:{digest}'
 
 
 class LimitPageNumberPaginator(PageNumberPagination):
@@ -6,6 +93,145 @@ class LimitPageNumberPaginator(PageNumberPagination):
 
     Этот класс расширяет стандартный класс PageNumberPagination
     и позволяет задавать размер страницы через URL параметр 'limit'.
+
+    Общее количество записей кэшируется на count_cache_timeout секунд
+    с инвалидацией при записи в таблицы запроса, а при заданном
+    count_estimate_threshold для больших выборок заменяется оценкой
+    планировщика. Поле count_exact в ответе сообщает, точен ли count.
+
+    Если в запросе передан параметр 'cursor' (в том числе пустой),
+    включается курсорный (keyset) режим: страница выбирается условием
+    по ключу сортировки последней выданной записи, без OFFSET и COUNT,
+    поэтому любая страница стоит столько же, сколько первая.
     """
     page_size_query_param = 'limit'
     page_size = 6
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+    count_cache_timeout = 30
+    count_estimate_threshold = None
+
+    @property
+    def django_paginator_class(self):
+        return partial(
+            CachedCountPaginator,
+            cache_timeout=self.count_cache_timeout,
+            estimate_threshold=self.count_estimate_threshold,
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Возвращает страницу по номеру или, в курсорном режиме, по ключу."""
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = self.get_cursor_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_cursor_filter(position))
+
+        page_size = self.get_page_size(request)
+        page = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            last = page[-1]
+            self.next_position = [
+                getattr(last, field.lstrip('-')) for field in self.ordering
+            ]
+        return page
+
+    def get_paginated_response(self, data):
+        """
+        Формирует ответ с признаком точности count.
+
+        В курсорном режиме ответ содержит только next и results.
+        """
+        if not self.cursor_mode:
+            return Response(OrderedDict([
+                ('count', self.page.paginator.count),
+                ('count_exact', self.page.paginator.count_exact),
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                ('results', data),
+            ]))
+        return Response(OrderedDict([
+            ('next', self.get_next_cursor_link()),
+            ('results', data),
+        ]))
+
+    def get_cursor_ordering(self, queryset):
+        """
+        Возвращает сортировку набора запросов с уникальным ключом в конце.
+
+        Берётся явная сортировка набора запросов или Meta.ordering модели;
+        если в ней нет первичного ключа, он добавляется для однозначности.
+        """
+        ordering = list(queryset.query.order_by
+                        or queryset.model._meta.ordering)
+        pk_names = {'pk', queryset.model._meta.pk.name}
+        if not pk_names & {field.lstrip('-') for field in ordering}:
+            ordering.append(queryset.model._meta.pk.name)
+        return ordering
+
+    def get_cursor_filter(self, position):
+        """
+        Строит условие "строго после position" для составного ключа.
+
+        Для ключа (a, b, c) это a > x OR (a = x AND b > y)
+        OR (a = x AND b = y AND c > z), с учётом направления сортировки.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def decode_cursor(self, request, model):
+        """Декодирует позицию из параметра cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return [
+                self.to_python(model, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, model, name, value):
+        """Приводит значение ключа из курсора к типу поля модели."""
+        if name == 'pk':
+            name = model._meta.pk.name
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        return field.to_python(value)
+
+    def encode_cursor(self, position):
+        """Кодирует позицию в строку для параметра cursor."""
+        data = json.dumps(
+            [value.isoformat() if hasattr(value, 'isoformat') else value
+             for value in position]
+        )
+        return urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def get_next_cursor_link(self):
+        """Возвращает ссылку на следующую страницу в курсорном режиме."""
+        if self.next_position is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(self.next_position))
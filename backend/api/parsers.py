@@ -0,0 +1,27 @@
+"""JSON-парсер API на orjson.
+
+Если пакет orjson не установлен или тело запроса не в UTF-8,
+используется стандартный парсер DRF на модуле json.
+"""
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONParser(parsers.JSONParser):
+    """Парсер JSON, читающий тело запроса одним вызовом orjson.loads."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,144 @@
+"""Формирование PDF со списком покупок вне процесса обработки запроса.
+
+Документ рисуется в пуле процессов ограниченного размера: шрифт
+регистрируется один раз при запуске процесса пула, а число ожидающих
+задач ограничено, поэтому всплеск скачиваний не занимает все
+синхронные воркеры gunicorn. При PDF_RENDER_WORKERS = 0 документ
+рисуется в текущем процессе (шрифт всё равно регистрируется один раз).
+
+Готовые документы хранятся в памяти процесса под хэшем строк списка
+покупок: пока корзина не менялась, повторное скачивание отдаёт
+документ из кэша без рисования.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from api.pools import BoundedPool
+
+# Путь к шрифту
+ROBOTO_FONT_PATH = os.path.join(
+    settings.BASE_DIR, 'fonts', 'roboto', 'Roboto-Bold.ttf')
+
+FONT_NAME = 'Roboto'
+
+
+class LRUBytesCache:
+    """
+    LRU-кэш байтовых строк с ограничением их суммарного размера.
+
+    При превышении max_bytes вытесняются давно не читанные записи;
+    значения больше max_bytes не кэшируются.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+documents = LRUBytesCache(settings.PDF_CACHE_MAX_BYTES)
+
+
+class PDFRenderUnavailable(APIException):
+    """Пул формирования PDF перегружен или не уложился в таймаут."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Не удалось сформировать PDF, попробуйте позже.'
+    default_code = 'pdf_render_unavailable'
+
+
+def register_fonts(font_path=ROBOTO_FONT_PATH):
+    """Регистрирует шрифт Roboto, если он ещё не зарегистрирован."""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, font_path))
+
+
+def draw_shopping_list(ingredients):
+    """
+    Рисует PDF-документ со списком покупок и возвращает его байты.
+
+    ingredients - последовательность словарей с ключами name,
+    measurement_unit и amount.
+    """
+    register_fonts()
+    pdf_buffer = BytesIO()
+    document = canvas.Canvas(pdf_buffer, pagesize=A4)
+    document.setFont(FONT_NAME, 16)
+
+    # Заголовок
+    document_title = "Список покупок"
+    page_width, page_height = A4
+    title_width = document.stringWidth(document_title, FONT_NAME, 16)
+    title_x = (page_width - title_width) / 2
+    document.drawString(title_x, page_height - 50, document_title)
+
+    # Список ингредиентов
+    document.setFont(FONT_NAME, 12)
+    text_y = page_height - 100
+
+    for item_number, item in enumerate(ingredients, 1):
+        line_text = (f"{item_number}. {item['name']}: "
+                     f"{item['amount']} {item['measurement_unit']}")
+        document.drawString(80, text_y, line_text)
+        text_y -= 20
+
+        if text_y < 50:
+            document.showPage()
+            document.setFont(FONT_NAME, 12)
+            text_y = page_height - 50
+
+    document.save()
+    return pdf_buffer.getvalue()
+
+
+pool = BoundedPool('PDF_RENDER', PDFRenderUnavailable,
+                   initializer=register_fonts, initargs=(ROBOTO_FONT_PATH,))
+
+
+def render_shopping_list(ingredients):
+    """
+    Возвращает байты PDF со списком покупок.
+
+    Документ ищется в кэше по хэшу строк списка и рисуется в пуле
+    только при промахе. Если пул перегружен, документ не сформирован
+    за PDF_RENDER_TIMEOUT секунд или пул сломан, выбрасывается
+    PDFRenderUnavailable (ответ 503).
+    """
+    ingredients = list(ingredients)
+    key = hashlib.sha256(repr(ingredients).encode('utf-8')).hexdigest()
+    document = documents.get(key)
+    if document is None:
+        document = pool.run(draw_shopping_list, ingredients)
+        documents.set(key, document)
+    return document
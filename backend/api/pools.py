@@ -0,0 +1,82 @@
+"""Ограниченные пулы процессов для тяжёлой работы вне запроса.
+
+Пул создаётся при первом обращении, число ожидающих задач ограничено,
+а ожидание результата - таймаутом, поэтому всплеск запросов
+не занимает все синхронные воркеры gunicorn. Процессы запускаются
+методом spawn: форк воркера с открытыми соединениями небезопасен.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+
+from django.conf import settings
+
+
+class BoundedPool:
+    """
+    Пул процессов с ограниченной очередью и таймаутом.
+
+    Размеры и таймаут читаются из настроек <prefix>_WORKERS,
+    <prefix>_QUEUE_SIZE и <prefix>_TIMEOUT. При <prefix>_WORKERS = 0
+    задача выполняется в текущем процессе. Если очередь заполнена,
+    задача не выполнена за таймаут или пул сломан, выбрасывается
+    исключение unavailable.
+    """
+
+    def __init__(self, prefix, unavailable, initializer=None, initargs=()):
+        self.prefix = prefix
+        self.unavailable = unavailable
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = None
+        self._slots = None
+        self._lock = Lock()
+
+    def setting(self, name):
+        return getattr(settings, f'{self.prefix}_{name}')
+
+    def get_executor(self):
+        """Возвращает пул процессов, создавая его при первом обращении."""
+        with self._lock:
+            if self._executor is None:
+                workers = self.setting('WORKERS')
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=self.initializer,
+                    initargs=self.initargs,
+                )
+                self._slots = BoundedSemaphore(
+                    workers + self.setting('QUEUE_SIZE'))
+            return self._executor, self._slots
+
+    def reset(self, executor):
+        """Сбрасывает сломанный пул, чтобы следующий вызов создал новый."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def run(self, function, *args):
+        """Выполняет function(*args) в пуле и возвращает результат."""
+        if not self.setting('WORKERS'):
+            return function(*args)
+        executor, slots = self.get_executor()
+        if not slots.acquire(blocking=False):
+            raise self.unavailable()
+        try:
+            future = executor.submit(function, *args)
+        except (BrokenProcessPool, RuntimeError):
+            slots.release()
+            self.reset(executor)
+            raise self.unavailable()
+        future.add_done_callback(lambda future: slots.release())
+        try:
+            return future.result(timeout=self.setting('TIMEOUT'))
+        except TimeoutError:
+            future.cancel()
+            raise self.unavailable()
+        except BrokenProcessPool:
+            self.reset(executor)
+            raise self.unavailable()
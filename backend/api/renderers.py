@@ -0,0 +1,115 @@
+"""Рендереры API.
+
+JSON-рендерер работает на orjson и умеет выдавать списки потоком;
+если пакет orjson не установлен или клиент запросил отступы,
+используется стандартный рендерер DRF на модуле json.
+
+Рендереры списка покупок выбираются согласованием содержимого
+(?format= или заголовок Accept) и выдают строки списка потоком.
+"""
+import csv
+from itertools import islice
+
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    Рендерер JSON, совпадающий по выводу с рендерером DRF.
+
+    Типы, которые orjson сериализует иначе, чем DRF (даты, Decimal,
+    ленивые строки), передаются кодировщику DRF.
+    """
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+               if orjson else None)
+    stream_chunk_size = 100
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(
+                accepted_media_type, renderer_context or {}):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=JSONEncoder().default,
+                           option=self.options)
+        # Как и DRF, экранируем символы, недопустимые в JavaScript.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
+
+    def render_stream(self, envelope, objects, serialize):
+        """
+        Выдаёт ответ со списком по частям.
+
+        envelope - данные ответа, в которых последним ключом идёт
+        пустой список results (или сам пустой список); объекты
+        из итерируемого objects сериализуются функцией serialize
+        порциями по stream_chunk_size и выдаются сразу после
+        сериализации, поэтому в памяти одновременно находится
+        только одна порция.
+        """
+        head = self.render(envelope)
+        closing = b']}' if isinstance(envelope, dict) else b']'
+        yield head[:-len(closing)]
+        objects = iter(objects)
+        separator = b''
+        while True:
+            chunk = list(islice(objects, self.stream_chunk_size))
+            if not chunk:
+                break
+            chunk = self.render(serialize(chunk))[1:-1]
+            if chunk:
+                yield separator + chunk
+                separator = b','
+        yield closing
+
+    def render_shopping_list(self, ingredients):
+        """Выдаёт список покупок JSON-массивом по частям."""
+        return self.render_stream([], ingredients, list)
+
+
+class ShoppingListPDFRenderer(renderers.BaseRenderer):
+    """Список покупок в PDF (формирует api.pdf)."""
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+
+class ShoppingListTextRenderer(renderers.BaseRenderer):
+    """Список покупок простым текстом, по строке на ингредиент."""
+    media_type = 'text/plain'
+    format = 'txt'
+    title = 'Список покупок'
+
+    def render_shopping_list(self, ingredients):
+        yield f'{self.title}\n\n'.encode(self.charset)
+        for item_number, item in enumerate(ingredients, 1):
+            yield (f"{item_number}. {item['name']}: {item['amount']} "
+                   f"{item['measurement_unit']}\n").encode(self.charset)
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(renderers.BaseRenderer):
+    """Список покупок в CSV с заголовком name,measurement_unit,amount."""
+    media_type = 'text/csv'
+    format = 'csv'
+    fields = ('name', 'measurement_unit', 'amount')
+
+    def render_shopping_list(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.fields).encode(self.charset)
+        for item in ingredients:
+            yield writer.writerow(
+                [item[field] for field in self.fields]
+            ).encode(self.charset)
@@ -1,14 +1,29 @@
 import re
+from hashlib import md5
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Manager
 from rest_framework.validators import UniqueTogetherValidator
 
 from users.models import Subscribtion
-from api.utils import Base64ImageField
-
+from api.cache import (
+    bump_version, get_versions, table_version_name, version_key
+)
+from api.images import thumbnail_srcset
+from api.indexes import ingredient_recipe_index
+from api.utils import (
+    Base64ImageField, BulkPrimaryKeyRelatedField, BulkResolveListSerializer,
+    get_recipes_limit
+)
+
+from recipes.constants import RECIPE_THUMBNAIL_WIDTHS
 from recipes.models import (Tag, Ingredient,
-                            Recipe, IngredientRecipe
+                            Recipe, IngredientRecipe, ShoppingListItem
                             )
+from users.constants import AVATAR_THUMBNAIL_WIDTHS
 
 
 User = get_user_model()
@@ -25,20 +40,41 @@ class UserSerializer(serializers.ModelSerializer):
     """Общий сериализатор пользователя
        Предоставляет информацию о пользователе и проверяет подписку.
     """
+    avatar_srcset = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('id', 'username',
                   'first_name', 'last_name',
-                  'email', 'avatar', 'is_subscribed'
+                  'email', 'avatar', 'avatar_srcset', 'is_subscribed'
                   )
 
-    def get_is_subscribed(self, obj):
+    def get_subscriptions(self):
+        """Возвращает идентификаторы авторов, на которых подписан
+           текущий пользователь.
+
+        Идентификаторы загружаются одним запросом и сохраняются
+        в контексте, общем для всех вложенных сериализаторов запроса.
+        """
         user = self.context.get('request').user
-        if user.is_authenticated:
-            return obj.followers.filter(user=user).exists()
-        return False
+        if not user.is_authenticated:
+            return set()
+        if 'subscriptions' not in self.context:
+            self.context['subscriptions'] = set(
+                user.following.values_list('following_id', flat=True)
+            )
+        return self.context['subscriptions']
+
+    def get_avatar_srcset(self, obj):
+        """Возвращает srcset миниатюр аватара в JPEG и WebP."""
+        return thumbnail_srcset(
+            self.context.get('request'), obj.avatar.storage,
+            obj.avatar.name, AVATAR_THUMBNAIL_WIDTHS)
+
+    def get_is_subscribed(self, obj):
+        """Проверяет подписку текущего пользователя на obj."""
+        return obj.id in self.get_subscriptions()
 
 
 class UserRegisterSerializer(serializers.ModelSerializer):
@@ -133,15 +169,33 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для записи ингредиентов в рецепт.
 
     Обрабатывает сериализацию данных о количестве
-    и идентификаторах ингредиентов.
+    и идентификаторах ингредиентов. Ингредиенты всего списка
+    загружаются одним запросом (см. BulkResolveListSerializer).
     """
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
     )
 
     class Meta:
         model = IngredientRecipe
         fields = ('id', 'amount')
+        list_serializer_class = BulkResolveListSerializer
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Сериализатор списка рецептов.
+
+    Берёт фрагменты всех рецептов страницы из кэша одним обращением
+    и загружает связанные объекты только для отсутствующих фрагментов.
+    """
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        fragments = self.child.get_fragments(recipes)
+        return [
+            self.child.apply_user_fields(fragments[recipe.id], recipe)
+            for recipe in recipes
+        ]
 
 
 class RecipeReadSerializer(serializers.ModelSerializer):
@@ -149,29 +203,221 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     Обрабатывает сериализацию данных рецепта, включая информацию об
     авторе, тегах, ингредиентах и статусах "в избранном" и "в корзине".
+
+    Не зависящая от пользователя часть представления (фрагмент)
+    кэшируется по id рецепта и версиям рецепта, автора, тегов
+    и ингредиентов; поля user_fields и author.is_subscribed
+    подставляются в фрагмент при каждом запросе.
     """
+    user_fields = ('is_favorited', 'is_in_shopping_cart')
+    fragment_timeout = 60 * 60
 
     author = UserSerializer()
     tags = TagSerializer(many=True)
     ingredients = RecipeIngredientReadSerializer(
         many=True, source='recipe_ingredients',
     )
+    image_srcset = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'author', 'tags', 'name', 'image', 'text',
-            'ingredients', 'is_favorited',
+            'id', 'author', 'tags', 'name', 'image', 'image_srcset',
+            'text', 'ingredients', 'is_favorited',
             'is_in_shopping_cart', 'cooking_time',
         )
         read_only_fields = ('author', 'tags', 'ingredients',)
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        fragment = self.get_fragments([instance])[instance.id]
+        return self.apply_user_fields(fragment, instance)
+
+    def get_fragment_keys(self, recipes):
+        """Возвращает ключи кэша фрагментов в виде {id рецепта: ключ}."""
+        catalog_keys = [
+            version_key(table_version_name(model._meta.db_table))
+            for model in (Tag, Ingredient)
+        ]
+        recipe_keys = {
+            recipe.id: (version_key('recipe', recipe.id),
+                        version_key('user', recipe.author_id))
+            for recipe in recipes
+        }
+        versions = get_versions(
+            catalog_keys
+            + [key for keys in recipe_keys.values() for key in keys]
+        )
+        catalog = [versions[key] for key in catalog_keys]
+        base_url = self.context.get('request').build_absolute_uri('/')
+        return {
+            recipe_id: 'recipe:{}:{}'.format(recipe_id, md5(repr(
+                (base_url, catalog, [versions[key] for key in keys])
+            ).encode('utf-8')).hexdigest())
+            for recipe_id, keys in recipe_keys.items()
+        }
+
+    def get_fragments(self, recipes):
+        """
+        Возвращает фрагменты рецептов в виде {id рецепта: фрагмент}.
+
+        Отсутствующие в кэше фрагменты строятся быстрым путём
+        build_fragments.
+        """
+        keys = self.get_fragment_keys(recipes)
+        cached = cache.get_many(keys.values())
+        fragments = {}
+        missing = []
+        for recipe in recipes:
+            if keys[recipe.id] in cached:
+                fragments[recipe.id] = cached[keys[recipe.id]]
+            else:
+                missing.append(recipe)
+        if missing:
+            built = self.build_fragments(missing)
+            cache.set_many(
+                {keys[recipe_id]: fragment
+                 for recipe_id, fragment in built.items()},
+                self.fragment_timeout
+            )
+            fragments.update(built)
+        return fragments
+
+    def build_fragments(self, recipes):
+        """
+        Быстро строит фрагменты рецептов в виде {id рецепта: фрагмент}.
+
+        Авторы, теги и ингредиенты читаются тремя запросами .values()
+        без создания моделей и полей DRF; каждый автор и тег
+        сериализуется один раз и переиспользуется во всех рецептах.
+        Результат совпадает с build_fragment байт в байт.
+        """
+        request = self.context.get('request')
+        recipe_ids = [recipe.id for recipe in recipes]
+
+        def file_url(storage, name):
+            if not name:
+                return None
+            return request.build_absolute_uri(storage.url(name))
+
+        avatar_storage = User._meta.get_field('avatar').storage
+        authors = {
+            row['id']: {
+                'id': row['id'],
+                'username': row['username'],
+                'first_name': row['first_name'],
+                'last_name': row['last_name'],
+                'email': row['email'],
+                'avatar': file_url(avatar_storage, row['avatar']),
+                'avatar_srcset': thumbnail_srcset(
+                    request, avatar_storage, row['avatar'],
+                    AVATAR_THUMBNAIL_WIDTHS),
+                'is_subscribed': None,
+            }
+            for row in User.objects.filter(
+                id__in={recipe.author_id for recipe in recipes}
+            ).values('id', 'username', 'first_name', 'last_name',
+                     'email', 'avatar')
+        }
+
+        tags = {pk: [] for pk in recipe_ids}
+        tag_data = {}
+        for recipe_id, tag_id, name, slug in (
+            Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids
+            ).order_by('tag__name').values_list(
+                'recipe_id', 'tag_id', 'tag__name', 'tag__slug')
+        ):
+            if tag_id not in tag_data:
+                tag_data[tag_id] = {'id': tag_id, 'name': name, 'slug': slug}
+            tags[recipe_id].append(tag_data[tag_id])
+
+        ingredients = {pk: [] for pk in recipe_ids}
+        for recipe_id, ingredient_id, name, unit, amount in (
+            IngredientRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', 'ingredient_id', 'ingredient__name',
+                          'ingredient__measurement_unit', 'amount')
+        ):
+            ingredients[recipe_id].append({
+                'id': ingredient_id,
+                'name': name,
+                'measurement_unit': unit,
+                'amount': amount,
+            })
+
+        image_storage = Recipe._meta.get_field('image').storage
+        return {
+            recipe.id: {
+                'id': recipe.id,
+                'author': authors[recipe.author_id],
+                'tags': tags[recipe.id],
+                'name': recipe.name,
+                'image': file_url(image_storage, recipe.image.name),
+                'image_srcset': thumbnail_srcset(
+                    request, image_storage, recipe.image.name,
+                    RECIPE_THUMBNAIL_WIDTHS),
+                'text': recipe.text,
+                'ingredients': ingredients[recipe.id],
+                'is_favorited': None,
+                'is_in_shopping_cart': None,
+                'cooking_time': recipe.cooking_time,
+            }
+            for recipe in recipes
+        }
+
+    def build_fragment(self, instance):
+        """
+        Сериализует рецепт без полей, зависящих от пользователя,
+        обычными полями DRF. Эталон для build_fragments.
+        """
+        fragment = super().to_representation(instance)
+        for field in self.user_fields:
+            fragment[field] = None
+        fragment['author']['is_subscribed'] = None
+        return fragment
+
+    def build_cached_fragment(self, instance):
+        """
+        Строит фрагмент рецепта через build_fragment и кладёт его в кэш.
+
+        Используется сразу после записи рецепта: автор, теги
+        и ингредиенты уже загружены в экземпляр (см.
+        RecipeCreateUpdateSerializer.prefetch_written), поэтому
+        фрагмент строится без запросов к БД.
+        """
+        fragment = self.build_fragment(instance)
+        cache.set(self.get_fragment_keys([instance])[instance.id],
+                  fragment, self.fragment_timeout)
+        return fragment
+
+    def apply_user_fields(self, fragment, instance):
+        """Дополняет фрагмент полями текущего пользователя."""
+        data = fragment.copy()
+        data['author'] = fragment['author'].copy()
+        data['author']['is_subscribed'] = (
+            instance.author_id in self.fields['author'].get_subscriptions()
+        )
+        for field in self.user_fields:
+            data[field] = getattr(self, f'get_{field}')(instance)
+        return data
+
+    def get_image_srcset(self, obj):
+        """Возвращает srcset миниатюр изображения рецепта в JPEG и WebP."""
+        return thumbnail_srcset(
+            self.context.get('request'), obj.image.storage, obj.image.name,
+            RECIPE_THUMBNAIL_WIDTHS)
 
     def get_is_favorited(self, obj):
         """Определяет, находится ли рецепт
            в избранном для текущего пользователя.
 
+        Флаг берётся из аннотации набора запросов
+        (см. RecipeQuerySet.with_user_flags), а при её отсутствии
+        вычисляется отдельным запросом.
+
         Аргументы:
             obj: Экземпляр рецепта, для которого проверяется статус.
 
@@ -179,12 +425,19 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             bool: True, если рецепт в избранном, иначе False.
         """
         user = self.context.get('request').user
-        if user.is_authenticated:
-            return obj.favorites.filter(user=user).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return obj.favorites.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, obj):
         """Определяет, находится ли рецепт в корзине для текущего пользователя.
+
+        Флаг берётся из аннотации набора запросов
+        (см. RecipeQuerySet.with_user_flags), а при её отсутствии
+        вычисляется отдельным запросом.
+
         Аргументы:
             obj: Экземпляр рецепта, для которого проверяется статус.
 
@@ -192,12 +445,14 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             bool: True, если рецепт в корзине, иначе False.
         """
         user = self.context.get('request').user
-        if user.is_authenticated:
-            return obj.cart_set.filter(user=user).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return obj.cart_set.filter(user=user).exists()
 
 
-class ShortRecipeSerializer(RecipeReadSerializer):
+class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для краткой информации о рецептах.
 
     Обрабатывает сериализацию основных данных рецепта, включая
@@ -205,10 +460,11 @@ class ShortRecipeSerializer(RecipeReadSerializer):
     """
 
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
     def get_image(self, obj):
         """Получает URL для изображения рецепта.
@@ -225,6 +481,12 @@ class ShortRecipeSerializer(RecipeReadSerializer):
             return request.build_absolute_uri(obj.image.url)
         return None
 
+    def get_image_srcset(self, obj):
+        """Возвращает srcset миниатюр изображения рецепта в JPEG и WebP."""
+        return thumbnail_srcset(
+            self.context.get('request'), obj.image.storage, obj.image.name,
+            RECIPE_THUMBNAIL_WIDTHS)
+
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """
@@ -235,7 +497,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     название, текст и время приготовления.
     Поддерживает валидацию тегов и ингредиентов.
     """
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True, required=True
     )
     ingredients = RecipeIngredientWriteSerializer(
@@ -255,6 +517,9 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         Аргументы:
             recipe: Экземпляр рецепта, к которому будут привязаны ингредиенты.
             ingredients_data: Данные о ингредиентах для записи.
+
+        Возвращает:
+            Список созданных объектов ингредиентов рецепта.
         """
         recipe_ingredient_objs = [
             IngredientRecipe(
@@ -264,6 +529,89 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             ) for ingredient_data in ingredients_data
         ]
         IngredientRecipe.objects.bulk_create(recipe_ingredient_objs)
+        self.ingredients_changed(recipe)
+        return recipe_ingredient_objs
+
+    def update_recipe_ingredients(self, recipe, ingredients_data):
+        """
+        Приводит ингредиенты рецепта к ingredients_data.
+
+        Текущие строки сравниваются с новыми данными: добавляются
+        только новые ингредиенты, обновляются только изменившиеся
+        количества и удаляются только исключённые ингредиенты.
+
+        Аргументы:
+            recipe: Экземпляр рецепта.
+            ingredients_data: Новые данные об ингредиентах.
+
+        Возвращает:
+            Список объектов ингредиентов рецепта после изменения.
+        """
+        current = {
+            row.ingredient_id: row for row in
+            IngredientRecipe.objects.filter(recipe=recipe).order_by().only(
+                'id', 'recipe_id', 'ingredient_id', 'amount')
+        }
+        rows, created, changed = [], [], []
+        for ingredient_data in ingredients_data:
+            row = current.pop(ingredient_data['id'].id, None)
+            if row is None:
+                row = IngredientRecipe(recipe=recipe,
+                                       amount=ingredient_data['amount'])
+                created.append(row)
+            elif row.amount != ingredient_data['amount']:
+                row.amount = ingredient_data['amount']
+                changed.append(row)
+            row.ingredient = ingredient_data['id']
+            rows.append(row)
+        if current:
+            # Удаление одним запросом без сигналов: версии и списки
+            # покупок обновляются ниже один раз на весь рецепт.
+            IngredientRecipe.objects.filter(
+                pk__in=[row.pk for row in current.values()]
+            )._raw_delete(IngredientRecipe.objects.db)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        if created:
+            IngredientRecipe.objects.bulk_create(created)
+        if current or changed or created:
+            self.ingredients_changed(recipe)
+        return rows
+
+    def ingredients_changed(self, recipe):
+        """Обновляет версии и списки покупок после записи ингредиентов."""
+        # Пакетные операции не отправляют сигналы, версии меняем явно.
+        bump_version('recipe', recipe.id)
+        bump_version(table_version_name(IngredientRecipe._meta.db_table))
+        ingredient_recipe_index.recipes_changed([recipe.id])
+        ShoppingListItem.objects.rebuild_for_recipe(recipe.id)
+
+    def set_written(self, recipe, tags, recipe_ingredients):
+        """
+        Запоминает в экземпляре рецепта записанные теги и ингредиенты,
+        чтобы ответ строился без повторного чтения их из БД.
+
+        Порядок совпадает с порядком моделей Tag и Ingredient.
+        Кэш prefetch_related заполняется только в to_representation:
+        UpdateModelMixin.update сбрасывает его после сохранения.
+        """
+        recipe._written_relations = {
+            'tags': sorted(tags, key=lambda tag: tag.name),
+            'recipe_ingredients': sorted(
+                recipe_ingredients, key=lambda row: row.ingredient.name),
+        }
+
+    def prefetch_written(self, recipe):
+        """Переносит записанные связи рецепта в кэш prefetch_related."""
+        written = recipe.__dict__.pop('_written_relations', {})
+        if not hasattr(recipe, '_prefetched_objects_cache'):
+            recipe._prefetched_objects_cache = {}
+        for name, objects in written.items():
+            recipe._prefetched_objects_cache.pop(name, None)
+            queryset = getattr(recipe, name).all()
+            queryset._result_cache = objects
+            queryset._prefetch_done = True
+            recipe._prefetched_objects_cache[name] = queryset
 
     def create(self, validated_data):
         """
@@ -276,14 +624,22 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             Экземпляр созданного рецепта.
         """
         ingredients_data = validated_data.pop('recipe_ingredients')
-        recipe = super().create(validated_data)
-        self.create_recipe_igredient(recipe, ingredients_data)
+        tags = validated_data['tags']
+        with transaction.atomic():
+            recipe = super().create(validated_data)
+            recipe_ingredients = self.create_recipe_igredient(
+                recipe, ingredients_data)
+        self.set_written(recipe, tags, recipe_ingredients)
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
         return recipe
 
     def update(self, instance, validated_data):
         """
         Обновляет существующий экземпляр рецепта с заданными данными.
 
+        Теги и ингредиенты изменяются по разнице с текущими строками,
+        всё обновление выполняется в одной транзакции.
+
         Аргументы:
             instance: Экземпляр рецепта, который необходимо обновить.
             validated_data: Валидированные данные для обновления.
@@ -292,9 +648,15 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             Обновленный экземпляр рецепта.
         """
         ingredients_data = validated_data.pop('recipe_ingredients')
-        instance = super().update(instance, validated_data)
-        instance.recipe_ingredients.all().delete()
-        self.create_recipe_igredient(instance, ingredients_data)
+        tags = validated_data['tags']
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            recipe_ingredients = self.update_recipe_ingredients(
+                instance, ingredients_data)
+        self.set_written(instance, tags, recipe_ingredients)
+        user = self.context['request'].user
+        if instance.author_id == user.id:
+            instance.author = user
         return instance
 
     def validate_tags(self, value):
@@ -376,15 +738,19 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         """
         Преобразует экземпляр рецепта в формат для чтения.
 
+        Фрагмент рецепта строится из записанных данных экземпляра
+        и сразу кладётся в кэш.
+
         Аргументы:
             instance: Экземпляр рецепта.
 
         Возвращает:
             Сериализованные данные рецепта.
         """
-        return RecipeReadSerializer(
-            instance, context=self.context
-        ).data
+        self.prefetch_written(instance)
+        serializer = RecipeReadSerializer(instance, context=self.context)
+        return serializer.apply_user_fields(
+            serializer.build_cached_fragment(instance), instance)
 
 
 class RecipesForUser(UserSerializer):
@@ -400,12 +766,16 @@ class RecipesForUser(UserSerializer):
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count', 'avatar')
+                  'is_subscribed', 'recipes', 'recipes_count', 'avatar',
+                  'avatar_srcset')
 
     def get_recipes(self, obj):
         """
         Получает список рецептов пользователя с учетом лимита.
 
+        Если рецепты уже загружены prefetch_limited_recipes,
+        дополнительный запрос не выполняется.
+
         Аргументы:
             obj: Экземпляр пользователя.
 
@@ -413,64 +783,12 @@ class RecipesForUser(UserSerializer):
             Список сериализованных рецептов.
         """
         request = self.context.get('request')
-        recipes = obj.recipes.all()
-        try:
-            limit = int(request.query_params.get('recipes_limit'))
-            recipes = recipes[:limit]
-        except TypeError:
-            pass
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.recipes.all()
+            limit = get_recipes_limit(request)
+            if limit is not None:
+                recipes = recipes[:limit]
         return ShortRecipeSerializer(recipes, many=True,
                                      context={'request': request}).data
-
-
-class UserRecipeCreationSerializer(serializers.ModelSerializer):
-    """
-    Сериализатор для создания связи между пользователем и рецептом.
-
-    Обрабатывает валидацию на уникальность пары (пользователь, рецепт)
-    для предотвращения дублирования записей.
-    """
-
-    class Meta:
-        model = None
-        fields = ('user', 'recipe')
-
-    def __init__(self, *args, **kwargs):
-        """
-        Инициализирует сериализатор и устанавливает модель, если она передана.
-
-        Аргументы:
-            *args: Позиционные аргументы для родительского класса.
-            **kwargs: Ключевые аргументы для настройки сериализатора.
-                Включает 'model_class', которая используется для настройки
-                класса модели и ее валидаторов.
-
-        """
-        model_class = kwargs.pop('model_class', None)
-        if model_class:
-            self.Meta.model = model_class
-            self.Meta.validators = (
-                UniqueTogetherValidator(
-                    queryset=model_class.objects.all(),
-                    fields=('user', 'recipe'),
-                    message=(
-                        'Рецепт уже добавлен в '
-                        f'{model_class._meta.verbose_name}.'
-                    )
-                ),
-            )
-        super().__init__(*args, **kwargs)
-
-    def to_representation(self, instance):
-        """
-        Преобразует экземпляр отношения пользователя и рецепта
-        в формат для чтения.
-
-        Аргументы:
-            instance: Экземпляр отношения, который нужно сериализовать.
-
-        Возвращает:
-            dict: Сериализованные данные рецепта.
-        """
-        recipe = instance.recipe
-        return ShortRecipeSerializer(recipe, context=self.context).data
@@ -0,0 +1,213 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_init, post_save
+)
+from django.dispatch import receiver
+
+from api.cache import bump_version, table_version_name
+from api.images import (
+    ImageProcessingUnavailable, release_image, save_thumbnails
+)
+from api.indexes import ingredient_recipe_index
+from recipes.constants import RECIPE_THUMBNAIL_WIDTHS
+from recipes.models import (
+    FavoriteRecipe, Ingredient, IngredientRecipe, Recipe, ShoppingCart,
+    ShoppingListItem, Tag
+)
+from users.constants import AVATAR_THUMBNAIL_WIDTHS
+from users.models import Subscribtion
+
+User = get_user_model()
+
+# Поля изображений с файлами, общими для записей, и ширины их миниатюр.
+IMAGE_FIELDS = {
+    Recipe: ('image', RECIPE_THUMBNAIL_WIDTHS),
+    User: ('avatar', AVATAR_THUMBNAIL_WIDTHS),
+}
+# Версии кэша, в представления которых входят srcset миниатюр.
+IMAGE_VERSIONS = {Recipe: 'recipe', User: 'user'}
+
+
+# Модели, версии таблиц которых читаются кэшами API (ETag списков,
+# фрагменты, справочники, счётчики пагинации и индексы).
+VERSIONED_MODELS = (
+    Tag, Ingredient, Recipe, IngredientRecipe, FavoriteRecipe, ShoppingCart,
+    User, Subscribtion,
+)
+
+
+def is_login_save(sender, update_fields):
+    """Сохранение только времени входа, не влияющее на ответы API."""
+    return sender is User and update_fields == frozenset({'last_login'})
+
+
+def bump_table_version(sender, update_fields=None, **kwargs):
+    """Меняет версию таблицы модели при сохранении или удалении записи."""
+    if not is_login_save(sender, update_fields):
+        bump_version(table_version_name(sender._meta.db_table))
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_table_version, sender=model)
+    post_delete.connect(bump_table_version, sender=model)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_through_table_version(sender, action, **kwargs):
+    """Меняет версию промежуточной таблицы при изменении тегов рецептов."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(table_version_name(sender._meta.db_table))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_recipe_version(sender, instance, **kwargs):
+    """Меняет версию рецепта при его сохранении или удалении."""
+    bump_version('recipe', instance.pk)
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def bump_recipe_ingredients_version(sender, instance, **kwargs):
+    """Меняет версию рецепта при изменении его ингредиентов."""
+    bump_version('recipe', instance.recipe_id)
+    ingredient_recipe_index.recipes_changed([instance.recipe_id])
+
+
+@receiver(request_started)
+def reset_index_changes(sender, **kwargs):
+    """Сбрасывает изменения индекса, оставшиеся от отменённых транзакций."""
+    ingredient_recipe_index.reset()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_version(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Меняет версии рецептов при изменении их тегов."""
+    if reverse and action == 'pre_clear':
+        instance._cleared_recipe_ids = set(
+            instance.recipes.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        pk_set = {instance.pk}
+    elif action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_recipe_ids', set())
+    for pk in pk_set:
+        bump_version('recipe', pk)
+
+
+@receiver(post_save, sender=User)
+def bump_user_version(sender, instance, update_fields=None, **kwargs):
+    """Меняет версию пользователя, входящего в представления рецептов."""
+    if not is_login_save(sender, update_fields):
+        bump_version('user', instance.pk)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribtion)
+@receiver(post_delete, sender=Subscribtion)
+def bump_user_state_version(sender, instance, **kwargs):
+    """Меняет версию избранного, корзины и подписок пользователя."""
+    bump_version('user_state', instance.user_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    """Прибавляет ингредиенты рецепта к списку покупок."""
+    if created:
+        ShoppingListItem.objects.add_recipe(
+            instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    """Вычитает ингредиенты рецепта из списка покупок."""
+    ShoppingListItem.objects.remove_recipe(
+        instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def rebuild_shopping_lists(sender, instance, **kwargs):
+    """Пересчитывает списки покупок при изменении состава рецепта."""
+    ShoppingListItem.objects.rebuild_for_recipe(instance.recipe_id)
+
+
+@receiver(post_init, sender=Recipe)
+@receiver(post_init, sender=User)
+def remember_image_name(sender, instance, **kwargs):
+    """Запоминает имя файла изображения, загруженное из БД."""
+    field, _ = IMAGE_FIELDS[sender]
+    # Отложенное поле не читается, чтобы не выполнять запрос.
+    if field in instance.__dict__:
+        value = instance.__dict__[field]
+        instance._original_image = getattr(value, 'name', value)
+
+
+def release_image_on_commit(sender, name):
+    """Освобождает файл изображения после фиксации транзакции."""
+    field, widths = IMAGE_FIELDS[sender]
+    transaction.on_commit(
+        lambda: release_image(sender, field, name, widths))
+
+
+def create_thumbnails(sender, pk, name):
+    """
+    Строит миниатюры изображения записи и меняет её версию,
+    чтобы srcset попал в закэшированные представления.
+
+    При перегруженном пуле миниатюры не строятся: их достраивает
+    команда generate_thumbnails.
+    """
+    field, widths = IMAGE_FIELDS[sender]
+    try:
+        created = save_thumbnails(
+            sender._meta.get_field(field).storage, name, widths)
+    except ImageProcessingUnavailable:
+        return
+    if created:
+        bump_version(IMAGE_VERSIONS[sender], pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def handle_image_change(sender, instance, **kwargs):
+    """
+    После фиксации транзакции строит миниатюры нового изображения
+    и освобождает прежний файл.
+
+    Сохранения, не менявшие изображение (в том числе запись времени
+    входа), ничего не делают. Изображение сравнивается с именем,
+    запомненным в remember_image_name.
+    """
+    field, _ = IMAGE_FIELDS[sender]
+    # Отложенное поле не загружалось и не менялось.
+    if field not in instance.__dict__:
+        return
+    name = getattr(instance, field).name
+    original = getattr(instance, '_original_image', None)
+    if hasattr(instance, '_original_image') and original == name:
+        return
+    instance._original_image = name
+    if name:
+        pk = instance.pk
+        transaction.on_commit(lambda: create_thumbnails(sender, pk, name))
+    if original:
+        release_image_on_commit(sender, original)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_deleted_image(sender, instance, **kwargs):
+    """Освобождает файл изображения удалённой записи."""
+    field, _ = IMAGE_FIELDS[sender]
+    name = getattr(instance, field).name
+    if name:
+        release_image_on_commit(sender, name)
@@ -1,3 +1,424 @@
-# from django.test import TestCase
+import base64
+import shutil
+import tempfile
+from threading import Barrier, Thread
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection, transaction
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import (
+    APIClient, APIRequestFactory, force_authenticate
+)
+
+from api import catalog
+from api.bitmaps import Bitmap
+from api.images import decode_data_uri, thumbnail_srcset
+from api.indexes import ingredient_recipe_index
+from api.serializers import RecipeReadSerializer
+from api.signals import IMAGE_FIELDS
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientRecipe,
+                            Recipe, ShoppingCart, ShoppingListItem, Tag)
+from users.models import Subscribtion
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x05\x04\x04\x00\x00\x00,'
+       b'\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeReadSerializerFastPathTest(TestCase):
+    """Быстрый путь сериализации рецептов совпадает с полями DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+            first_name='Читатель', last_name='Первый')
+        authors = [
+            User.objects.create_user(
+                username=f'author{index}', email=f'author{index}@example.com',
+                password='pass', first_name='Автор', last_name=str(index),
+                avatar=SimpleUploadedFile(f'avatar{index}.gif', GIF)
+                if index else None)
+            for index in range(2)
+        ]
+        tags = [
+            Tag.objects.create(name=name, slug=slug)
+            for name, slug in (('ужин', 'dinner'), ('завтрак', 'breakfast'),
+                               ('обед', 'lunch'))
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('соль', 'г'), ('молоко', 'мл'),
+                               ('яйца', 'шт'), ('Мука', 'г'))
+        ]
+        for index in range(5):
+            recipe = Recipe.objects.create(
+                author=authors[index % 2], name=f'Рецепт «{index}»',
+                text='Описание\nв "две" строки', cooking_time=index + 1,
+                image=SimpleUploadedFile(f'recipe{index}.gif', GIF)
+                if index % 3 else None)
+            recipe.tags.set(tags[:index % 3 + 1])
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=10 * (position + 1))
+                for position, ingredient in enumerate(
+                    ingredients[index % 2:])
+            )
+        FavoriteRecipe.objects.create(
+            user=cls.reader, recipe=Recipe.objects.first())
+        Subscribtion.objects.create(user=cls.reader, following=authors[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_serializer(self, user=None):
+        request = APIRequestFactory().get('/api/recipes/')
+        if user is not None:
+            force_authenticate(request, user)
+        return RecipeReadSerializer(context={'request': Request(request)})
+
+    def test_build_fragments_is_byte_identical(self):
+        serializer = self.get_serializer()
+        recipes = list(Recipe.objects.all())
+        fast = serializer.build_fragments(recipes)
+        for recipe in recipes:
+            with self.subTest(recipe=recipe.id):
+                self.assertEqual(
+                    JSONRenderer().render(fast[recipe.id]),
+                    JSONRenderer().render(serializer.build_fragment(recipe)),
+                )
+
+    def test_list_response_is_byte_identical(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.get('/api/recipes/', {'limit': 10})
+        self.assertEqual(response.status_code, 200)
+
+        serializer = self.get_serializer(self.reader)
+        expected = [
+            serializer.apply_user_fields(
+                serializer.build_fragment(recipe), recipe)
+            for recipe in Recipe.objects.with_user_flags(self.reader)
+        ]
+        self.assertEqual(
+            JSONRenderer().render(response.data['results']),
+            JSONRenderer().render(expected),
+        )
+
+
+class SubscriptionRecipesLimitTest(TestCase):
+    """recipes_limit ограничивает рецепты, но не их число в подписках."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        authors = [
+            User.objects.create_user(
+                username=f'author{index}', email=f'author{index}@example.com',
+                password='pass')
+            for index in range(2)
+        ]
+        for index, author in enumerate(authors):
+            Subscribtion.objects.create(user=cls.reader, following=author)
+            for number in range(3 + index):
+                Recipe.objects.create(
+                    author=author, name=f'Рецепт {index}-{number}',
+                    text='Описание', cooking_time=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_subscriptions(self, limit):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.get('/api/users/subscriptions/',
+                              {'recipes_limit': limit})
+        self.assertEqual(response.status_code, 200)
+        return {
+            author['username']: (author['recipes_count'],
+                                 len(author['recipes']))
+            for author in response.data['results']
+        }
+
+    def test_recipes_limit(self):
+        for limit, expected in (
+            (0, {'author0': (3, 0), 'author1': (4, 0)}),
+            (2, {'author0': (3, 2), 'author1': (4, 2)}),
+            (10, {'author0': (3, 3), 'author1': (4, 4)}),
+        ):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.get_subscriptions(limit), expected)
+
+
+class BitmapTest(SimpleTestCase):
+    """Сжатые битовые карты совпадают с операциями над множествами."""
+
+    def test_set_operations(self):
+        sets = (
+            set(),
+            {0, 1, 65535, 65536, 10 ** 6},
+            set(range(60000, 75000, 2)),
+            set(range(0, 140000, 7)),
+        )
+        for first in sets:
+            bitmap = Bitmap.from_ids(first)
+            self.assertEqual(bitmap.to_ids(), sorted(first))
+            self.assertEqual(len(bitmap), len(first))
+            for second in sets:
+                other = Bitmap.from_ids(second)
+                self.assertEqual((bitmap & other).to_ids(),
+                                 sorted(first & second))
+                self.assertEqual((bitmap | other).to_ids(),
+                                 sorted(first | second))
+                removed = set(sorted(first)[::3])
+                self.assertEqual(bitmap.changed(second, removed).to_ids(),
+                                 sorted(first - removed | second))
+
+
+class DecodeDataUriTest(SimpleTestCase):
+    """base64 с переносами строк декодируется порциями без потерь."""
+
+    @mock.patch('api.images.DECODE_CHUNK_SIZE', 7)
+    def test_whitespace_across_chunks(self):
+        content = bytes(range(256)) * 4
+        encoded = base64.b64encode(content).decode()
+        for data in (
+            encoded,
+            base64.encodebytes(content).decode(),
+            ' \r\n'.join(encoded[i:i + 5] for i in range(0, len(encoded), 5)),
+        ):
+            self.assertEqual(
+                decode_data_uri(f'data:image/png;base64,{data}'), content)
+        with self.assertRaises(ValidationError):
+            decode_data_uri(f'data:image/png;base64,{encoded[:-1]}')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_WORKERS=0)
+class ImageThumbnailsTest(TestCase):
+    """Миниатюры строятся после фиксации и только для новых изображений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Автор', last_name='Первый')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def srcset(self, instance, field):
+        field_file = getattr(instance, field)
+        return thumbnail_srcset(
+            APIRequestFactory().get('/'), field_file.storage,
+            field_file.name, IMAGE_FIELDS[type(instance)][1])
+
+    def test_thumbnails_created_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.author, name='Рецепт', text='Описание',
+                cooking_time=1,
+                image=SimpleUploadedFile('recipe.gif', GIF))
+            self.assertIsNone(self.srcset(recipe, 'image'))
+        self.assertIsNotNone(self.srcset(recipe, 'image'))
+
+    def test_unchanged_image_schedules_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.avatar = SimpleUploadedFile('avatar.gif', GIF)
+            self.author.save()
+        author = User.objects.get(pk=self.author.pk)
+        with mock.patch('api.signals.save_thumbnails') as save_thumbnails, \
+                self.captureOnCommitCallbacks(execute=True):
+            author.save(update_fields=['last_login'])
+            author.first_name = 'Другой'
+            author.save()
+        save_thumbnails.assert_not_called()
+
+
+@override_settings(INGREDIENT_SEARCH_LIMIT=2)
+class IngredientCatalogTest(TestCase):
+    """Справочник ингредиентов и поиск по началу названия."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('сахар', 'сода', 'соль', 'мука'))
+
+    def setUp(self):
+        catalog._bodies.clear()
+
+    def get_names(self, **params):
+        response = APIClient().get('/api/ingredients/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(item['name'] for item in response.json())
+
+    def test_blank_name_returns_full_catalog(self):
+        full = self.get_names()
+        self.assertEqual(len(full), 4)
+        for name in ('', '  '):
+            for prefix_index in (False, True):
+                with self.subTest(name=name, prefix_index=prefix_index), \
+                        self.settings(INGREDIENT_PREFIX_INDEX=prefix_index):
+                    self.assertEqual(self.get_names(name=name), full)
+
+    def test_name_search_is_limited(self):
+        self.assertEqual(len(self.get_names(name='с')), 2)
+
+    def test_accept_encoding_q_values(self):
+        br = 'br' if catalog.brotli else 'gzip'
+        for header, expected in (
+            ('', None),
+            ('gzip, deflate, br', br),
+            ('br;q=0, gzip', 'gzip'),
+            ('gzip;q=0, br;q=0', None),
+            ('gzip;q=0.5, identity', None),
+            ('gzip;q=0.5, br;q=0.8', br),
+            ('*;q=0', None),
+        ):
+            with self.subTest(header=header):
+                response = APIClient().get(
+                    '/api/ingredients/', HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.get('Content-Encoding'), expected)
+
+
+class IngredientRecipeIndexTest(TestCase):
+    """Изменения отменённых транзакций не попадают в журнал индекса."""
+
+    def test_request_resets_rolled_back_changes(self):
+        try:
+            with transaction.atomic():
+                ingredient_recipe_index.recipes_changed([1])
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        self.assertEqual(ingredient_recipe_index.local.pending, {1})
+        APIClient().get('/api/tags/')
+        self.assertEqual(ingredient_recipe_index.local.pending, set())
+
+
+class RecipeSearchTest(TestCase):
+    """Полнотекстовый поиск рецептов на PostgreSQL и SQLite."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        for name, text in (
+            ('Борщ украинский', 'Свекла и капуста на говяжьем бульоне'),
+            ('Щи', 'Суп из свежей капусты'),
+            ('Омлет', 'Яйца взбить с молоком'),
+        ):
+            Recipe.objects.create(author=author, name=name, text=text,
+                                  cooking_time=30)
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, value):
+        response = APIClient().get('/api/recipes/', {'search': value})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], len(response.data['results']))
+        return {recipe['name'] for recipe in response.data['results']}
+
+    def test_search_by_name_and_text(self):
+        self.assertEqual(self.search('борщ'), {'Борщ украинский'})
+        self.assertEqual(self.search('капуст'), {'Борщ украинский', 'Щи'})
+        self.assertEqual(self.search('капуст бульон'), {'Борщ украинский'})
+        self.assertEqual(self.search('пицца'), set())
+
+    def test_search_follows_updated_recipes(self):
+        recipe = Recipe.objects.get(name='Омлет')
+        recipe.name = 'Омлет с сыром'
+        recipe.text = 'Яйца и тёртый пармезан'
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        self.assertEqual(self.search('пармезан'), {'Омлет с сыром'})
+        self.assertEqual(self.search('взбить'), set())
+
+
+class UserRecipeToggleConcurrencyTest(TransactionTestCase):
+    """Одновременные добавления и удаления рецепта применяются один раз."""
+
+    threads = 8
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('SQLite в памяти не допускает одновременной '
+                          'записи из нескольких соединений.')
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass')
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            cooking_time=5)
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=self.recipe, ingredient=Ingredient.objects
+                             .create(name=name, measurement_unit='г'),
+                             amount=amount)
+            for name, amount in (('соль', 5), ('мука', 200))
+        )
+
+    def request_concurrently(self, method, url):
+        """Отправляет запрос из нескольких потоков одновременно."""
+        barrier = Barrier(self.threads)
+        statuses = []
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                statuses.append(getattr(client, method)(url).status_code)
+            finally:
+                connection.close()
+
+        workers = [Thread(target=send) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return sorted(statuses)
+
+    def shopping_list(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user).values_list('ingredient__name', 'amount'))
+
+    def test_favorite_added_and_removed_once(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        self.assertEqual(self.request_concurrently('post', url),
+                         [201] + [400] * (self.threads - 1))
+        self.assertEqual(FavoriteRecipe.objects.count(), 1)
+        self.assertEqual(self.request_concurrently('delete', url),
+                         [204] + [400] * (self.threads - 1))
+        self.assertFalse(FavoriteRecipe.objects.exists())
+
+    def test_shopping_cart_added_and_removed_once(self):
+        url = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        self.assertEqual(self.request_concurrently('post', url),
+                         [201] + [400] * (self.threads - 1))
+        self.assertEqual(ShoppingCart.objects.count(), 1)
+        self.assertEqual(self.shopping_list(), {'соль': 5, 'мука': 200})
+        self.assertEqual(self.request_concurrently('delete', url),
+                         [204] + [400] * (self.threads - 1))
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertEqual(self.shopping_list(), {})
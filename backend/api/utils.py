@@ -1,86 +1,170 @@
-import os
-import base64
-
 from io import BytesIO
 from datetime import datetime
-from django.conf import settings
-from reportlab.pdfgen import canvas
-from django.http import HttpResponse
+from django.db.models import Count, F, Window
+from django.db.models.expressions import OrderBy
+from django.db.models.functions import RowNumber
+from django.http import FileResponse
 from rest_framework import serializers
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from rest_framework.relations import MANY_RELATION_KWARGS
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.core.files.base import ContentFile
 
+from api.images import process_data_uri
+from api.pdf import render_shopping_list
+from recipes.models import Recipe
+
+
+def get_recipes_limit(request):
+    """
+    Возвращает значение параметра recipes_limit из запроса.
+
+    Некорректное или отрицательное значение означает отсутствие лимита.
+    """
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
 
-# Путь к шрифту
-ROBOTO_FONT_PATH = os.path.join(
-    settings.BASE_DIR, 'fonts', 'roboto', 'Roboto-Bold.ttf')
+def prefetch_limited_recipes(authors, limit=None):
+    """
+    Загружает рецепты для страницы авторов одним запросом.
+
+    Рецепты нумеруются оконной функцией ROW_NUMBER в пределах автора
+    в порядке Recipe.Meta.ordering, и ограничение limit применяется
+    в БД. Тем же проходом оконный COUNT считает общее число рецептов
+    автора. Результат сохраняется в атрибутах limited_recipes
+    и recipes_count каждого автора.
 
-# Константа для директории shop_list
-SHOP_LIST_DIR = os.path.join(
-    settings.BASE_DIR, 'recipes', 'data', 'shop_list')
+    Первый рецепт автора выбирается и при limit = 0: по нему
+    определяется число рецептов, а в limited_recipes он не попадает.
+    """
+    authors_by_id = {}
+    for author in authors:
+        author.limited_recipes = []
+        author.recipes_count = 0
+        authors_by_id[author.id] = author
+    if not authors_by_id:
+        return
+
+    partition_by = [F('author_id')]
+    ranked = Recipe.objects.filter(
+        author_id__in=authors_by_id
+    ).annotate(
+        recipe_rank=Window(
+            RowNumber(),
+            partition_by=partition_by,
+            order_by=[
+                OrderBy(F(field.lstrip('-')), descending=field[0] == '-')
+                for field in Recipe._meta.ordering
+            ],
+        ),
+        author_recipes_count=Window(Count('id'), partition_by=partition_by),
+    ).order_by()
+    sql, params = ranked.query.sql_with_params()
+    sql = f'SELECT * FROM ({sql}) ranked'
+    if limit is not None:
+        sql += ' WHERE ranked.recipe_rank <= %s'
+        params += (max(limit, 1),)
+    sql += ' ORDER BY ranked.recipe_rank'
+
+    for recipe in Recipe.objects.raw(sql, params):
+        author = authors_by_id[recipe.author_id]
+        author.recipes_count = recipe.author_recipes_count
+        if limit is None or recipe.recipe_rank <= limit:
+            author.limited_recipes.append(recipe)
 
 
 def create_shopping_list_pdf(ingredients):
     """
-    Создаёт PDF-документ со списком покупок
-    с использованием шрифта Roboto.
+    Возвращает ответ с PDF-документом списка покупок.
+
+    Документ формируется в пуле процессов (см. api.pdf)
+    и отдаётся клиенту без сохранения на диск.
     """
-    os.makedirs(SHOP_LIST_DIR, exist_ok=True)
     filename = f"shopping_list_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    file_path = os.path.join(SHOP_LIST_DIR, filename)
+    return FileResponse(
+        BytesIO(render_shopping_list(ingredients)), as_attachment=True,
+        filename=filename, content_type='application/pdf')
 
-    pdf_buffer = BytesIO()
-    document = canvas.Canvas(pdf_buffer, pagesize=A4)
 
-    # Регистрация шрифта Roboto
-    pdfmetrics.registerFont(TTFont('Roboto', ROBOTO_FONT_PATH))
-    document.setFont('Roboto', 16)
-
-    # Заголовок
-    document_title = "Список покупок"
-    page_width, page_height = A4
-    title_width = document.stringWidth(document_title, 'Roboto', 16)
-    title_x = (page_width - title_width) / 2
-    document.drawString(title_x, page_height - 50, document_title)
+class Base64ImageField(serializers.ImageField):
+    """
+    Для расшифровки изображений (аватар и рецепт).
 
-    # Список ингредиентов
-    document.setFont('Roboto', 12)
-    text_y = page_height - 100
-    item_number = 1
+    Изображение из data URI проверяется до декодирования
+    и сохраняется в JPEG ограниченного размера, см. api.images.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:image'):
+            data = ContentFile(process_data_uri(data), name='image.jpg')
+        return super().to_internal_value(data)
 
-    for item in ingredients:
-        name = item['recipe__ingredients__name']
-        quantity = item['total_amount']
-        unit = item['recipe__ingredients__measurement_unit']
-        line_text = f"{item_number}. {name}: {quantity} {unit}"
-        document.drawString(80, text_y, line_text)
-        item_number += 1
-        text_y -= 20
 
-        if text_y < 50:
-            document.showPage()
-            document.setFont('Roboto', 12)
-            text_y = page_height - 50
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Связь по первичному ключу, объекты которой загружаются пачкой.
 
-    document.save()
-    pdf_buffer.seek(0)
+    Поле само проверяет только формат ключа и возвращает его.
+    Объекты всех ключей загружаются одним запросом IN: при many=True
+    в BulkManyRelatedField, во вложенном списке сериализаторов -
+    в BulkResolveListSerializer. Все несуществующие ключи
+    перечисляются в одной ошибке.
+    """
+    default_error_messages = {
+        'does_not_exist': 'Объекты с id {pk_value} не существуют.',
+        'incorrect_type': 'Некорректный тип id: ожидалось число, '
+                          'получено {data_type}.',
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        list_kwargs.update(
+            (key, value) for key, value in kwargs.items()
+            if key in MANY_RELATION_KWARGS)
+        return BulkManyRelatedField(**list_kwargs)
 
-    with open(file_path, 'wb') as pdf_file:
-        pdf_file.write(pdf_buffer.getvalue())
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def resolve(self, pks):
+        """Возвращает объекты ключей pks в том же порядке."""
+        objects = self.get_queryset().in_bulk(set(pks))
+        missing = sorted({pk for pk in pks if pk not in objects})
+        if missing:
+            self.fail('does_not_exist',
+                      pk_value=', '.join(map(str, missing)))
+        return [objects[pk] for pk in pks]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список связей BulkPrimaryKeyRelatedField, загружаемый одним запросом."""
 
-    response = HttpResponse(pdf_buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    def to_internal_value(self, data):
+        return self.child_relation.resolve(super().to_internal_value(data))
 
-    return response
 
+class BulkResolveListSerializer(serializers.ListSerializer):
+    """
+    Список вложенных сериализаторов, в котором объекты полей
+    BulkPrimaryKeyRelatedField всех элементов загружаются одним
+    запросом на поле.
+    """
 
-class Base64ImageField(serializers.ImageField):
-    """Для расшифровки изображений (аватар и рецепт)."""
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+        items = super().to_internal_value(data)
+        for field in self.child.fields.values():
+            if not isinstance(field, BulkPrimaryKeyRelatedField):
+                continue
+            key = field.source_attrs[-1]
+            objects = field.resolve([item[key] for item in items])
+            for item, value in zip(items, objects):
+                item[key] = value
+        return items
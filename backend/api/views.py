@@ -1,34 +1,53 @@
+from hashlib import md5
+from math import ceil
+
 import short_url
 from django.conf import settings
-from django.db.models import Sum, Count, Prefetch
 from djoser.serializers import SetPasswordSerializer
 
 from rest_framework.response import Response
-from rest_framework import viewsets, status
+from rest_framework import serializers, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.settings import api_settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import redirect, get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
+from api.catalog import catalog_response
+from api.indexes import ingredient_prefix_index
+from api.cache import get_versions, table_version_name, version_key
+from api.images import thumbnail_srcset
 from api.permissions import IsAuthorOrReadOnly
+from api.renderers import (
+    JSONRenderer, ShoppingListCSVRenderer, ShoppingListPDFRenderer,
+    ShoppingListTextRenderer
+)
 from rest_framework.permissions import (AllowAny,
                                         IsAuthenticated,
                                         )
 from api.serializers import (
     AvatarSerializer, IngredientSerializer, SubscribSerializer,
     RecipeCreateUpdateSerializer, RecipeReadSerializer,
-    TagSerializer, UserRecipeCreationSerializer,
+    ShortRecipeSerializer, TagSerializer,
     UserRegisterSerializer, UserSerializer, RecipesForUser
 
 
 )
-from api.utils import create_shopping_list_pdf
+from api.utils import (
+    create_shopping_list_pdf, get_recipes_limit, prefetch_limited_recipes
+)
 from api.filters import RecipeFilter, IngredientFilter
 from api.paginators import LimitPageNumberPaginator
+from users.constants import AVATAR_THUMBNAIL_WIDTHS
 from users.models import Subscribtion
 from django.contrib.auth import get_user_model
 
 from recipes.models import (Tag, Ingredient, Recipe,
                             IngredientRecipe,
-                            FavoriteRecipe, ShoppingCart
+                            FavoriteRecipe, ShoppingCart, ShoppingListItem
                             )
 
 
@@ -99,8 +118,15 @@ class UserViewSet(viewsets.ModelViewSet):
             user.avatar = serializer.validated_data['avatar']
             user.save()
             avatar_url = request.build_absolute_uri(user.avatar.url)
-            return Response({'avatar': avatar_url}, status=status.HTTP_200_OK)
-        user.avatar.delete()
+            return Response({
+                'avatar': avatar_url,
+                'avatar_srcset': thumbnail_srcset(
+                    request, user.avatar.storage, user.avatar.name,
+                    AVATAR_THUMBNAIL_WIDTHS),
+            }, status=status.HTTP_200_OK)
+        # Файл может быть общим, его удаляет сигнал после проверки ссылок.
+        user.avatar = None
+        user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(['get'], detail=False, permission_classes=[IsAuthenticated])
@@ -111,9 +137,10 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         user = request.user
         paginator = self.pagination_class()
-        queryset = User.objects.filter(followers__user=user).annotate(
-            recipe_count=Count('recipes')).order_by('-id')
+        queryset = User.objects.filter(followers__user=user).order_by('-id')
         paginated_queryset = paginator.paginate_queryset(queryset, request)
+        prefetch_limited_recipes(paginated_queryset,
+                                 get_recipes_limit(request))
         serializer = RecipesForUser(paginated_queryset, many=True,
                                     context={'request': request})
         return paginator.get_paginated_response(serializer.data)
@@ -131,8 +158,8 @@ class UserViewSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        obj = User.objects.annotate(recipes_count=Count('recipes')).get(id=pk)
-        response_serializer = RecipesForUser(obj,
+        prefetch_limited_recipes([user_to_follow], get_recipes_limit(request))
+        response_serializer = RecipesForUser(user_to_follow,
                                              context={'request': request})
         return Response(response_serializer.data,
                         status=status.HTTP_201_CREATED)
@@ -165,6 +192,26 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """
+        Полный список отдаётся готовым ответом из памяти,
+        поиск по началу названия - из индекса в памяти процесса
+        или из БД; в обоих случаях не более INGREDIENT_SEARCH_LIMIT.
+        Пустой или пробельный name равнозначен его отсутствию.
+        """
+        name = request.query_params.get('name', '').strip()
+        if name and settings.INGREDIENT_PREFIX_INDEX:
+            return Response(ingredient_prefix_index.search(
+                name, settings.INGREDIENT_SEARCH_LIMIT))
+        if name:
+            queryset = self.filter_queryset(
+                self.get_queryset())[:settings.INGREDIENT_SEARCH_LIMIT]
+            return Response(self.get_serializer(queryset, many=True).data)
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return catalog_response(request, self.queryset,
+                                self.get_serializer_class())
+
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet для тегов"""
@@ -173,26 +220,140 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """Список тегов отдаётся готовым ответом из памяти."""
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return catalog_response(request, self.queryset,
+                                self.get_serializer_class())
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Общий ViewSet рецептов"""
-    queryset = Recipe.objects.prefetch_related(
-        'tags',
-        Prefetch(
-            'recipe_ingredients',
-            queryset=IngredientRecipe.objects.select_related('ingredient'))
-    ).select_related('author')
+    queryset = Recipe.objects.all()
 
     filterset_class = RecipeFilter
     http_method_names = ('get', 'post', 'patch', 'delete')
     # permission_classes = [IsAuthorOrReadOnly]
     pagination_class = LimitPageNumberPaginator
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        """
+        Ошибки скачивания списка покупок отдаются в JSON: рендереры
+        PDF, TXT и CSV умеют выдавать только сам список.
+        """
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if (getattr(response, 'exception', False)
+                and self.action == 'download_shopping_cart'):
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+        return response
+
     def get_permissions(self):
-        """Определяет разрешения в зависимости от метода запроса."""
+        """
+        Определяет разрешения в зависимости от метода запроса.
+
+        Разрешения, заданные в @action, проверяются вместе
+        с IsAuthorOrReadOnly.
+        """
         if self.action in ['list', 'retrieve']:
             return [AllowAny()]
-        return [IsAuthorOrReadOnly()]
+        return [IsAuthorOrReadOnly(), *super().get_permissions()]
+
+    def get_queryset(self):
+        """Аннотирует рецепты флагами избранного и корзины пользователя."""
+        return super().get_queryset().with_user_flags(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов с поддержкой условного GET."""
+        tables = (Recipe, Recipe.tags.through, IngredientRecipe,
+                  Tag, Ingredient, User)
+        return self.conditional_response(
+            [version_key(table_version_name(model._meta.db_table))
+             for model in tables],
+            self.list_recipes, request, *args, **kwargs
+        )
+
+    def list_recipes(self, request, *args, **kwargs):
+        """Отфильтрованная страница рецептов."""
+        return self.get_list_response(
+            self.filter_queryset(self.get_queryset()))
+
+    def get_list_response(self, queryset):
+        """
+        Возвращает страницу рецептов из queryset.
+
+        Страницы не меньше STREAMING_LIST_MIN_SIZE отдаются потоком:
+        рецепты сериализуются и отправляются клиенту порциями,
+        без сборки всего тела ответа в памяти.
+        """
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(self.get_serializer(queryset, many=True).data)
+        renderer = self.request.accepted_renderer
+        if (len(page) < settings.STREAMING_LIST_MIN_SIZE
+                or not hasattr(renderer, 'render_stream')):
+            return self.get_paginated_response(
+                self.get_serializer(page, many=True).data)
+        return StreamingHttpResponse(
+            renderer.render_stream(
+                self.get_paginated_response([]).data, page,
+                lambda chunk: self.get_serializer(chunk, many=True).data),
+            content_type=renderer.media_type,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт с поддержкой условного GET."""
+        try:
+            pk = Recipe._meta.pk.to_python(kwargs[self.lookup_field])
+        except ValidationError:
+            raise Http404
+        author_id = Recipe.objects.filter(
+            pk=pk
+        ).values_list('author_id', flat=True).first()
+        if author_id is None:
+            return super().retrieve(request, *args, **kwargs)
+        keys = [version_key('recipe', pk),
+                version_key('user', author_id)]
+        keys += [version_key(table_version_name(model._meta.db_table))
+                 for model in (Tag, Ingredient)]
+        return self.conditional_response(
+            keys, super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, keys, view_method, request,
+                             *args, **kwargs):
+        """
+        Отвечает 304, если данные клиента актуальны, иначе вызывает
+        view_method.
+
+        ETag вычисляется по версиям из keys и версии избранного,
+        корзины и подписок пользователя, Last-Modified - по самой
+        поздней из этих версий. Запросы и сериализатор при совпадении
+        валидаторов не выполняются.
+        """
+        user = request.user
+        if user.is_authenticated:
+            keys = keys + [version_key('user_state', user.id)]
+        versions = get_versions(keys)
+        etag = '"{}"'.format(md5(repr((
+            request.build_absolute_uri(),
+            request.accepted_media_type,
+            user.id,
+            sorted(versions.items()),
+        )).encode('utf-8')).hexdigest())
+        last_modified = ceil(max(versions.values()) / 10 ** 9)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view_method(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Authorization',))
+        return response
 
     def perform_create(self, serializer):
         """Добавление автора при создании рецепта."""
@@ -204,42 +365,79 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeReadSerializer
         return RecipeCreateUpdateSerializer
 
-    @action(['get'], detail=False, permission_classes=[IsAuthenticated])
+    @action(['get'], detail=False, permission_classes=[IsAuthenticated],
+            renderer_classes=(ShoppingListPDFRenderer,
+                              ShoppingListTextRenderer,
+                              ShoppingListCSVRenderer, JSONRenderer))
     def download_shopping_cart(self, request):
         """
-        Скачивание списка покупок в формате PDF.
-        Составляется на основе рецептов в корзине пользователя.
+        Скачивание списка покупок.
+
+        Формат выбирается параметром format (pdf, txt, csv, json)
+        или заголовком Accept, по умолчанию - PDF. Текстовые форматы
+        отдаются потоком прямо из итогов списка покупок.
         """
-        user = request.user
-        ingredients_summary = user.cart_set.values(
-            'recipe__ingredients__name',
-            'recipe__ingredients__measurement_unit'
-        ).annotate(total_amount=Sum('recipe__recipe_ingredients__amount'))
-        return create_shopping_list_pdf(ingredients_summary)
+        ingredients = ShoppingListItem.objects.for_user(request.user)
+        renderer = request.accepted_renderer
+        if renderer.format == 'pdf':
+            return create_shopping_list_pdf(ingredients)
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.render_shopping_list(ingredients),
+            content_type=content_type)
+        if renderer.format == 'csv':
+            response['Content-Disposition'] = (
+                'attachment; filename="shopping_list.csv"')
+        return response
+
+    @action(['get'], detail=False, permission_classes=[IsAuthenticated])
+    def shopping_list(self, request):
+        """Итоги списка покупок текущего пользователя в формате JSON."""
+        return Response(
+            list(ShoppingListItem.objects.for_user(request.user)))
 
     def create_user_recipe_creation(self, request, model, pk):
         """
         Универсальный метод для добавления рецепта в избранное или корзину.
+
+        Связь добавляется одним INSERT ... ON CONFLICT (см.
+        UserRecipeQuerySet.add): повторное или одновременное
+        добавление того же рецепта получает ответ 400.
         """
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        serializer = UserRecipeCreationSerializer(
-            data={'user': user.id, 'recipe': recipe.id},
-            model_class=model, context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        recipe = get_object_or_404(
+            Recipe.objects.only('id', 'name', 'image', 'cooking_time'),
+            id=pk)
+        try:
+            created = model.objects.add(request.user.id, recipe.id)
+        except IntegrityError:
+            # Рецепт удалён одновременно с добавлением.
+            raise Http404
+        if not created:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f'Рецепт уже добавлен в {model._meta.verbose_name}.'
+                ]
+            })
+        return Response(
+            ShortRecipeSerializer(recipe, context={'request': request}).data,
+            status=status.HTTP_201_CREATED)
 
     def delete_user_recipe_creation(self, request, model, pk, error_msg=None):
         """
         Универсальный метод для удаления рецепта из избранного или корзины.
+
+        Связь удаляется одним DELETE (см. UserRecipeQuerySet.remove);
+        существование рецепта проверяется только если удалять нечего.
         """
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        if model.objects.filter(user=user, recipe=recipe).exists():
-            model.objects.filter(user=user, recipe=recipe).delete()
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
+        if model.objects.remove(request.user.id, recipe_id):
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, id=recipe_id)
         return Response(error_msg, status=status.HTTP_400_BAD_REQUEST)
 
     @action(['post'], True, permission_classes=[IsAuthenticated],)
@@ -270,19 +468,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Список избранных рецептов текущего пользователя."""
 
         user = request.user
-        queryset = Recipe.objects.filter(favorites__user=user).select_related(
-            'author'
-        ).prefetch_related('tags', 'recipe_ingredients__ingredient')
-
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = RecipeReadSerializer(page, many=True,
-                                              context={'request': request})
-            return self.get_paginated_response(serializer.data)
-
-        serializer = RecipeReadSerializer(queryset, many=True,
-                                          context={'request': request})
-        return Response(serializer.data)
+        queryset = Recipe.objects.filter(
+            favorites__user=user).with_user_flags(user)
+        return self.get_list_response(queryset)
 
     @action(['post'], True, url_path='favorite',
             permission_classes=[IsAuthenticated],
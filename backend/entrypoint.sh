@@ -4,6 +4,7 @@
 echo "Выполняю миграции..."
 python manage.py makemigrations
 python manage.py migrate --noinput
+python manage.py createcachetable
 
 # Копирование медиа и статики
 echo "Копирование медиа и статических файлов..."
@@ -15,6 +16,10 @@ echo "Собранные статические файлы скопирован
 cp -r /app/docs/. /docs/
 echo "Документация скопирована."
 
+# Миниатюры изображений, загруженных до обновления
+echo "Строю недостающие миниатюры..."
+python manage.py generate_thumbnails
+
 
 # Импорт ингредиентов
 echo "Импортируем ингредиенты..."
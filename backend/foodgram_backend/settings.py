@@ -87,6 +87,49 @@ else:
         }
     }
 
+# Кэши счётчиков пагинации и фрагментов ответов API (default)
+# и версий данных с журналом индексов (versions). Кэши должны быть
+# общими для всех воркеров gunicorn и команд manage.py, иначе изменения,
+# сделанные в другом процессе, не сбрасывают кэши. По умолчанию
+# используются таблицы в БД (создаются командой createcachetable),
+# при отладке - память процесса. Версии хранятся отдельно, чтобы
+# вытеснение фрагментов не сбрасывало их; для локальных бэкендов
+# размер кэшей задаётся числом записей, после которого они
+# прореживаются.
+
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    'django.core.cache.backends.locmem.LocMemCache' if DEBUG
+    else 'django.core.cache.backends.db.DatabaseCache'
+)
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 100_000))
+VERSIONS_CACHE_MAX_ENTRIES = int(
+    os.getenv('VERSIONS_CACHE_MAX_ENTRIES', 1_000_000))
+# Параметр MAX_ENTRIES понимают только встроенные бэкенды без сервера.
+CULLING_CACHE_BACKENDS = (
+    'django.core.cache.backends.db.DatabaseCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', '' if DEBUG else 'django_cache'),
+    },
+    'versions': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'VERSIONS_CACHE_LOCATION',
+            'versions' if DEBUG else 'django_cache_versions'),
+    },
+}
+if CACHE_BACKEND in CULLING_CACHE_BACKENDS:
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': CACHE_MAX_ENTRIES}
+    CACHES['versions']['OPTIONS'] = {
+        'MAX_ENTRIES': VERSIONS_CACHE_MAX_ENTRIES}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -135,6 +178,17 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
 
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
     'PAGINATE_BY_PARAM': 'limit',
@@ -160,6 +214,8 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загружаемые файлы именуются по хэшу содержимого и хранятся один раз.
+DEFAULT_FILE_STORAGE = 'foodgram_backend.storage.ContentAddressedStorage'
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
@@ -173,6 +229,39 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CSV_FILES_DIR = BASE_DIR / 'recipes/data/'
 
+# Поиск ингредиентов по началу названия: индекс в памяти процесса
+# (False - поиск в БД по функциональному индексу) и лимит результатов.
+INGREDIENT_PREFIX_INDEX = os.getenv('INGREDIENT_PREFIX_INDEX', 'True') == 'True'
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+# Фильтр рецептов по ингредиентам: наибольшее число id рецептов,
+# передаваемых в БД списком; при большем числе условие строится
+# подзапросом к таблице ингредиентов рецептов.
+INGREDIENT_FILTER_MAX_IDS = int(os.getenv('INGREDIENT_FILTER_MAX_IDS', 1000))
+
+# Страницы списков не меньше этого размера отдаются потоком.
+STREAMING_LIST_MIN_SIZE = int(os.getenv('STREAMING_LIST_MIN_SIZE', 100))
+
+# Формирование PDF списка покупок: число процессов пула (0 - в процессе
+# запроса), число задач в очереди сверх них и таймаут в секундах.
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', 2))
+PDF_RENDER_QUEUE_SIZE = int(os.getenv('PDF_RENDER_QUEUE_SIZE', 8))
+PDF_RENDER_TIMEOUT = float(os.getenv('PDF_RENDER_TIMEOUT', 10))
+# Суммарный размер готовых PDF в кэше процесса, байт (0 - без кэша).
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Загрузка изображений в base64: наибольший размер файла в байтах
+# и разрешение в пикселях; перекодирование выполняется в пуле
+# процессов (0 - в процессе запроса) с очередью и таймаутом в секундах.
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.getenv('IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv('IMAGE_UPLOAD_MAX_PIXELS', 40_000_000))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_QUEUE_SIZE = int(os.getenv('IMAGE_QUEUE_SIZE', 8))
+IMAGE_TIMEOUT = float(os.getenv('IMAGE_TIMEOUT', 10))
+# Файл изображения без ссылок не удаляется сразу, если он сохранён
+# или повторно использован менее этого числа секунд назад.
+IMAGE_RELEASE_GRACE_PERIOD = int(
+    os.getenv('IMAGE_RELEASE_GRACE_PERIOD', 600))
 
 
 DJANGO_SUPERUSER_EMAIL = os.getenv('DJANGO_SUPERUSER_EMAIL')
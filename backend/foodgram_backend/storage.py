@@ -0,0 +1,90 @@
+"""Хранилище загружаемых файлов с адресацией по содержимому.
+
+Файл сохраняется под именем <каталог upload_to>/<sha256 содержимого>
+<расширение>, поэтому одинаковые изображения хранятся один раз,
+а содержимое файла под данным именем никогда не меняется и может
+кэшироваться клиентами бессрочно. Удалять такой файл можно только
+когда на него не осталось ссылок, см. api.images.release_image.
+
+Повторное использование существующего файла и его удаление
+выполняются под общей для процессов блокировкой (файл .lock
+в каталоге хранилища), а время изменения повторно использованного
+файла обновляется: так удаление не затрагивает файл, ссылка на который
+ещё не зафиксирована в БД.
+"""
+import fcntl
+import hashlib
+import os
+import posixpath
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+from recipes.images import THUMBNAIL_DIR
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage, именующее файлы по хэшу содержимого.
+
+    Повторное сохранение того же содержимого не пишет файл заново
+    и возвращает существующее имя. Файлы под exact_name_prefixes
+    (миниатюры, производные от уже хэшированных имён) сохраняются
+    под переданным именем с заменой.
+    """
+    exact_name_prefixes = (f'{THUMBNAIL_DIR}/',)
+    lock_name = '.lock'
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется в _save по содержимому.
+        return name
+
+    def content_name(self, name, content):
+        """Возвращает имя файла по sha256 его содержимого."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        dirname, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(dirname, digest.hexdigest() + extension)
+
+    @contextmanager
+    def lock(self):
+        """Блокировка хранилища, общая для потоков и процессов."""
+        os.makedirs(self.location, exist_ok=True)
+        with open(os.path.join(self.location, self.lock_name), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def recently_saved(self, name):
+        """
+        Файл name сохранён или повторно использован менее
+        IMAGE_RELEASE_GRACE_PERIOD секунд назад.
+        """
+        try:
+            modified = os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return time.time() - modified < settings.IMAGE_RELEASE_GRACE_PERIOD
+
+    def _save(self, name, content):
+        if not name.startswith(self.exact_name_prefixes):
+            name = self.content_name(name, content)
+            with self.lock():
+                if self.exists(name):
+                    os.utime(self.path(name))
+                    return name
+        # Файл пишется под временным именем и атомарно переименовывается,
+        # поэтому одновременная загрузка того же содержимого безопасна.
+        dirname, filename = posixpath.split(name)
+        temporary = super()._save(
+            posixpath.join(dirname, f'.{uuid.uuid4().hex}.{filename}'),
+            content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
@@ -1,5 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from recipes.constants import RECIPE_THUMBNAIL_WIDTHS
+from recipes.images import thumbnail_name
 from recipes.models import (
     Tag, Ingredient, Recipe, ShoppingCart,
     FavoriteRecipe, TagRecipe, IngredientRecipe
@@ -86,9 +88,11 @@ class RecipeAdmin(admin.ModelAdmin):
     def preview_image(self, obj):
         """Отображает миниатюру изображения рецепта в админке."""
         if obj.image:
+            url = obj.image.storage.url(thumbnail_name(
+                obj.image.name, RECIPE_THUMBNAIL_WIDTHS[0], 'jpg'))
             return format_html('''
                 '<img src="{}" style="max-width: 100px; max-height: 100px;"/>'
-                               '''.format(obj.image.url))
+                               '''.format(url))
         return 'Нет изображения'
 
     preview_image.short_description = 'Предпросмотр'
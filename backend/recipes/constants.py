@@ -2,3 +2,5 @@
 MAX_LENGTH_NAME = 150
 # Максимальная длина строки для сокращённого отображения
 MAX_SPLIT_LENGTH = 50
+# Ширины миниатюр изображения рецепта, пикселей
+RECIPE_THUMBNAIL_WIDTHS = (100, 400, 800)
@@ -0,0 +1,102 @@
+"""Обработка изображений рецептов.
+
+Модуль не зависит от Django, поэтому его функции можно выполнять
+в процессах пула без настройки проекта.
+"""
+import posixpath
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Наибольший размер изображения рецепта после нормализации, пикселей.
+IMAGE_MAX_SIZE = (1600, 1600)
+JPEG_QUALITY = 85
+ORIENTATION_TAG = 0x0112
+BACKGROUND_COLOR = (255, 255, 255)
+# Форматы миниатюр: расширение файла и формат Pillow.
+THUMBNAIL_FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP'}
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_DIR = 'thumbnails'
+
+
+def to_rgb(image):
+    """Приводит изображение к RGB, заливая прозрачный фон белым."""
+    if image.mode in ('RGBA', 'LA', 'PA') or (
+            image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, BACKGROUND_COLOR)
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+
+def normalize_image(data, max_size=IMAGE_MAX_SIZE):
+    """
+    Приводит изображение к JPEG в RGB не больше max_size.
+
+    Учитывается ориентация из EXIF, прозрачный фон заменяется белым;
+    JPEG при уменьшении декодируется сразу в пониженном разрешении.
+    JPEG, который уже удовлетворяет этим условиям, возвращается без
+    перекодирования. Возвращает байты JPEG.
+    """
+    with Image.open(BytesIO(data)) as image:
+        if (image.format == 'JPEG' and image.mode == 'RGB'
+                and image.width <= max_size[0]
+                and image.height <= max_size[1]
+                and image.getexif().get(ORIENTATION_TAG, 1) == 1):
+            return data
+        image.draft('RGB', max_size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(max_size)
+        image = to_rgb(image)
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+def normalize_image_file(path):
+    """Читает файл изображения и возвращает нормализованный JPEG."""
+    with open(path, 'rb') as file:
+        return normalize_image(file.read())
+
+
+def thumbnail_name(name, width, extension):
+    """Имя файла миниатюры шириной width для файла изображения name."""
+    root = posixpath.splitext(name)[0]
+    return f'{THUMBNAIL_DIR}/{root}_{width}.{extension}'
+
+
+def make_thumbnails(data, widths):
+    """
+    Строит миниатюры изображения заданных ширин во всех форматах.
+
+    Высота миниатюры пропорциональна ширине; изображения уже
+    нужной ширины не увеличиваются. Каждая следующая миниатюра
+    уменьшается из предыдущей. Возвращает словарь
+    {(ширина, расширение): байты}.
+    """
+    thumbnails = {}
+    with Image.open(BytesIO(data)) as image:
+        image.draft('RGB', (max(widths), 1))
+        image = to_rgb(ImageOps.exif_transpose(image))
+        for width in sorted(widths, reverse=True):
+            if width < image.width:
+                image = image.resize(
+                    (width, max(1, round(image.height * width / image.width))),
+                    Image.LANCZOS)
+            for extension, image_format in THUMBNAIL_FORMATS.items():
+                buffer = BytesIO()
+                image.save(buffer, image_format, quality=THUMBNAIL_QUALITY)
+                thumbnails[width, extension] = buffer.getvalue()
+    return thumbnails
+
+
+def process_image_file(path, widths):
+    """
+    Читает файл изображения и возвращает пару
+    (нормализованный JPEG, миниатюры), см. make_thumbnails.
+    """
+    image = normalize_image_file(path)
+    return image, make_thumbnails(image, widths)
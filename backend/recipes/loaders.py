@@ -0,0 +1,192 @@
+"""Пакетная загрузка справочников ингредиентов и тегов из файлов.
+
+Файлы CSV, JSON (массив объектов) и JSON Lines читаются потоком,
+по одной записи, и вставляются пачками; уже существующие записи
+пропускаются самой БД по ограничениям уникальности, поэтому повторная
+загрузка того же файла ничего не меняет. В PostgreSQL ингредиенты
+загружаются через COPY во временную таблицу и переносятся одним
+INSERT ... ON CONFLICT.
+"""
+import csv
+import json
+import os
+from io import StringIO
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from recipes.models import Ingredient, Tag
+
+BATCH_SIZE = 1000
+
+DEFAULT_TAGS = (
+    {'name': 'завтрак', 'slug': 'breakfast'},
+    {'name': 'обед', 'slug': 'lunch'},
+    {'name': 'ужин', 'slug': 'dinner'},
+    {'name': 'закуски', 'slug': 'snaks'},
+    {'name': 'напитки', 'slug': 'drinks'},
+    {'name': 'алкогольные коктейли', 'slug': 'alcoholic cocktails'},
+    {'name': 'выпечка', 'slug': 'baked goods'},
+)
+
+
+def iter_csv(file):
+    """Выдаёт строки CSV с заголовком в виде словарей."""
+    yield from csv.DictReader(file)
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """
+    Выдаёт элементы JSON-массива верхнего уровня по одному.
+
+    Файл читается порциями по chunk_size символов, поэтому в памяти
+    одновременно находятся только текущая порция и текущий элемент.
+    Пустой файл считается пустым массивом.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    # None - до '[', first - первый элемент или ']',
+    # value - элемент после ',', separator - ',' или ']'.
+    state = None
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if buffer:
+            if state is None:
+                if buffer[0] != '[':
+                    raise ValueError('Ожидался JSON-массив.')
+                buffer, state = buffer[1:], 'first'
+                continue
+            if state in ('first', 'separator') and buffer[0] == ']':
+                return
+            if state == 'separator':
+                if buffer[0] != ',':
+                    raise ValueError('Ожидалась запятая между элементами.')
+                buffer, state = buffer[1:], 'value'
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # Элемент в самом конце порции мог быть прочитан
+                # не полностью (например, число), дочитываем файл.
+                if end < len(buffer) or eof:
+                    yield item
+                    buffer, state = buffer[end:], 'separator'
+                    continue
+        if eof:
+            if state is None:
+                return
+            raise ValueError('Незавершённый JSON-массив.')
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+
+def iter_jsonl(file):
+    """Выдаёт объекты файла JSON Lines, по одному на строку."""
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_file(path):
+    """Выдаёт записи файла CSV, JSON или JSON Lines (по расширению)."""
+    if path.endswith(('.jsonl', '.ndjson')):
+        reader = iter_jsonl
+    elif path.endswith('.json'):
+        reader = iter_json_array
+    else:
+        reader = iter_csv
+    with open(path, newline='', encoding='utf-8') as file:
+        yield from reader(file)
+
+
+def batches(rows, size=BATCH_SIZE):
+    """Разбивает поток записей на списки длиной не больше size."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def clean_ingredients(rows):
+    """Нормализует записи ингредиентов и пропускает пустые."""
+    for row in rows:
+        name = (row.get('name') or '').strip()
+        unit = (row.get('measurement_unit') or '').strip()
+        if name and unit:
+            yield name, unit
+
+
+def load_ingredients(rows, batch_size=BATCH_SIZE, using='default'):
+    """
+    Добавляет ингредиенты, которых ещё нет в БД.
+
+    Возвращает пару (прочитано записей, добавлено ингредиентов).
+    """
+    connection = connections[using]
+    before = Ingredient.objects.using(using).count()
+    with transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            read = copy_ingredients(connection, rows, batch_size)
+        else:
+            read = 0
+            for batch in batches(clean_ingredients(rows), batch_size):
+                Ingredient.objects.using(using).bulk_create(
+                    [Ingredient(name=name, measurement_unit=unit)
+                     for name, unit in batch],
+                    ignore_conflicts=True,
+                )
+                read += len(batch)
+    return read, Ingredient.objects.using(using).count() - before
+
+
+def copy_ingredients(connection, rows, batch_size):
+    """Загружает ингредиенты в PostgreSQL через COPY и INSERT ... SELECT."""
+    table = Ingredient._meta.db_table
+    read = 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE ingredient_import '
+            '(name varchar(255), measurement_unit varchar(50)) '
+            'ON COMMIT DROP'
+        )
+        for batch in batches(clean_ingredients(rows), batch_size):
+            buffer = StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                'COPY ingredient_import FROM STDIN WITH (FORMAT csv)', buffer)
+            read += len(batch)
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT name, measurement_unit FROM ingredient_import '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+    return read
+
+
+def load_tags(rows, using='default'):
+    """
+    Добавляет теги, которых ещё нет в БД.
+
+    Возвращает пару (прочитано записей, добавлено тегов).
+    """
+    tags = [
+        Tag(name=row['name'].strip(), slug=row['slug'].strip())
+        for row in rows if row.get('name') and row.get('slug')
+    ]
+    before = Tag.objects.using(using).count()
+    Tag.objects.using(using).bulk_create(tags, ignore_conflicts=True)
+    return len(tags), Tag.objects.using(using).count() - before
+
+
+def default_path(name):
+    """Путь к файлу справочника по умолчанию."""
+    return os.path.join(settings.CSV_FILES_DIR, name)
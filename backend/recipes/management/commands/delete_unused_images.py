@@ -0,0 +1,45 @@
+# Удаление файлов изображений рецептов и аватаров, на которые нет ссылок
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from api.images import release_image
+from recipes.constants import RECIPE_THUMBNAIL_WIDTHS
+from recipes.models import Recipe
+from users.constants import AVATAR_THUMBNAIL_WIDTHS
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы изображений рецептов и аватаров пользователей '
+        'вместе с миниатюрами, если на них не осталось ссылок.'
+    )
+
+    def handle(self, *args, **options):
+        """
+        Обходит каталоги изображений и освобождает файлы без ссылок.
+
+        Файлы, сохранённые менее IMAGE_RELEASE_GRACE_PERIOD секунд
+        назад, не удаляются.
+        """
+        targets = (
+            (Recipe, 'image', RECIPE_THUMBNAIL_WIDTHS),
+            (User, 'avatar', AVATAR_THUMBNAIL_WIDTHS),
+        )
+        for model, field, widths in targets:
+            model_field = model._meta.get_field(field)
+            storage, directory = model_field.storage, model_field.upload_to
+            deleted = 0
+            if storage.exists(directory):
+                referenced = set(model._default_manager.exclude(
+                    **{field: ''}).values_list(field, flat=True))
+                for filename in storage.listdir(directory)[1]:
+                    name = f'{directory.rstrip("/")}/{filename}'
+                    if filename.startswith('.') or name in referenced:
+                        continue
+                    if release_image(model, field, name, widths):
+                        deleted += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: '
+                f'удалено файлов {deleted}'))
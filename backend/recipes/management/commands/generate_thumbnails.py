@@ -0,0 +1,51 @@
+# Построение миниатюр для уже загруженных изображений рецептов и аватаров
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_version
+from api.images import ImageProcessingUnavailable, save_thumbnails
+from recipes.constants import RECIPE_THUMBNAIL_WIDTHS
+from recipes.models import Recipe
+from users.constants import AVATAR_THUMBNAIL_WIDTHS
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит недостающие миниатюры изображений рецептов и аватаров '
+        'пользователей.'
+    )
+
+    def handle(self, *args, **options):
+        """
+        Обходит изображения и создаёт отсутствующие миниатюры.
+
+        Версии записей с новыми миниатюрами меняются, чтобы srcset
+        попал в закэшированные представления.
+        """
+        targets = (
+            (Recipe.objects.exclude(image=''), 'image',
+             RECIPE_THUMBNAIL_WIDTHS, 'recipe'),
+            (User.objects.exclude(avatar='').exclude(avatar__isnull=True),
+             'avatar', AVATAR_THUMBNAIL_WIDTHS, 'user'),
+        )
+        for queryset, field, widths, version_name in targets:
+            storage = queryset.model._meta.get_field(field).storage
+            processed = failed = 0
+            for instance in queryset.only('pk', field).iterator():
+                try:
+                    if save_thumbnails(storage, getattr(instance, field).name,
+                                       widths):
+                        bump_version(version_name, instance.pk)
+                except (ImageProcessingUnavailable, OSError,
+                        ValueError) as error:
+                    failed += 1
+                    self.stderr.write(self.style.WARNING(
+                        f'{queryset.model._meta.verbose_name} '
+                        f'{instance.pk}: {error}'))
+                else:
+                    processed += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{queryset.model._meta.verbose_name_plural}: '
+                f'обработано {processed}, с ошибками {failed}'))
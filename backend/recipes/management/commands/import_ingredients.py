@@ -1,64 +1,61 @@
-# Вариант загрузки в БД в формате csv
-import csv
+# Загрузка справочников в БД из файлов CSV или JSON
 import os
+import time
+
 from django.core.management.base import BaseCommand
+
+from api.cache import bump_version, table_version_name
+from recipes.loaders import (
+    BATCH_SIZE, DEFAULT_TAGS, default_path, iter_file, load_ingredients,
+    load_tags
+)
 from recipes.models import Ingredient, Tag
 
 
 class Command(BaseCommand):
-    help = 'Импортирует ингредиенты из файла CSV'
-
-    def handle(self, *args, **kwargs):
+    help = 'Импортирует ингредиенты и теги из файлов CSV или JSON'
+    default_ingredients = default_path('ingredients.csv')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients', default=self.default_ingredients,
+            help='Файл ингредиентов (.csv или .json)')
+        parser.add_argument(
+            '--tags', default=default_path('tags.csv'),
+            help='Файл тегов (.csv или .json); если он пуст или его нет, '
+                 'загружаются теги по умолчанию')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Размер пачки вставки')
+
+    def handle(self, *args, **options):
         """
-        Обрабатывает команду для импорта ингредиентов из файла CSV.
+        Обрабатывает команду импорта справочников.
 
-        Читает данные из CSV файла и добавляет их в базу данных.
-        Если ингредиент с таким же именем уже существует, он игнорируется.
-        Для каждого добавленного
-        Или существующего ингредиента выводится сообщение.
+        Файлы читаются потоком и вставляются пачками; существующие
+        ингредиенты и теги пропускаются, поэтому повторный запуск
+        ничего не меняет. Выводится число записей и скорость загрузки.
         """
-
-        # Определяет путь к CSV файлу
-        path_to_file = os.path.join(
-            os.path.dirname(__file__), '..', '..', 'data', 'ingredients.csv')
-
-        # Открывает CSV файл для чтения
-        with open(path_to_file, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                # Получает или создает ингредиент на основе данных из CSV
-                ingredient, created = Ingredient.objects.get_or_create(
-                    name=row['name'],
-                    measurement_unit=row['measurement_unit']
-                )
-
-                if created:
-                    # Вывод сообщения об успешном добавлении нового ингредиента
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Ингредиент добавлен: {ingredient}'))
-                else:
-                    # Вывод предупреждения об уже существующем ингредиенте
-                    self.stdout.write(self.style.WARNING(
-                        f'Ингредиент уже существует: {ingredient}'))
-
-        # Импорт тегов
-        tags = [
-            ('завтрак', 'breakfast'),
-            ('обед', 'lunch'),
-            ('ужин', 'dinner'),
-            ('закуски', 'snaks'),
-            ('напитки', 'drinks'),
-            ('алкогольные коктейли', 'alcoholic cocktails'),
-            ('выпечка', 'baked goods'),
-        ]
-        self.stdout.write('Начинаю загрузку тегов в базу...')
-
-        # Создание объектов тегов
-        tag_objects = [Tag(name=name, slug=slug) for name, slug in tags]
-        Tag.objects.bulk_create(tag_objects, ignore_conflicts=True)
-
-        self.stdout.write(
-            f'Загрузка в базу - ЗАВЕРШЕНА\n'
-            f'Всего тегов в базе: {Tag.objects.count()}\n'
-            f'-----------------------------------------------'
-        )
+        started = time.monotonic()
+        read, added = load_ingredients(
+            iter_file(options['ingredients']), options['batch_size'])
+        self.report('Ингредиенты', read, added, started)
+        if added:
+            # Вставка пачками не отправляет сигналы, версию меняем явно.
+            bump_version(table_version_name(Ingredient._meta.db_table))
+
+        started = time.monotonic()
+        rows = []
+        if os.path.exists(options['tags']):
+            rows = list(iter_file(options['tags']))
+        read, added = load_tags(rows or DEFAULT_TAGS)
+        self.report('Теги', read, added, started)
+        if added:
+            bump_version(table_version_name(Tag._meta.db_table))
+
+    def report(self, title, read, added, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'{title}: прочитано {read}, добавлено {added} '
+            f'за {elapsed:.2f} с ({read / elapsed:.0f} записей/с)'
+        ))
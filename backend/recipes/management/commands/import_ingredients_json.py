@@ -1,30 +1,12 @@
 # Вариант загрузки в БД в формате json
+import os
 
-# import json
-# import os
-# from django.core.management.base import BaseCommand
-# from recipes.models import Ingredient
-#
-# class Command(BaseCommand):
-#     help = 'Импортирует ингредиенты из файла JSON'
-#
-#     def handle(self, *args, **kwargs):
-#         path_to_file = os.path.join(
-#             os.path.dirname(__file__), '..', '..', 'data',
-#                                           'ingredients.json')
-#
-#         with open(path_to_file, 'r', encoding='utf-8') as jsonfile:
-#             data = json.load(jsonfile)
-#             for item in data:
-#                 ingredient, created = Ingredient.objects.get_or_create(
-#                     name=item['name'],
-#                     measurement_unit=item['measurement_unit']
-#                 )
-#
-#                 if created:
-#                     self.stdout.write(self.style.SUCCESS(
-#                         f'Ингредиент добавлен: {ingredient}'))
-#                 else:
-#                     self.stdout.write(self.style.WARNING(
-#                         f'Ингредиент уже существует: {ingredient}'))
-#
+from django.conf import settings
+
+from recipes.management.commands import import_ingredients
+
+
+class Command(import_ingredients.Command):
+    help = 'Импортирует ингредиенты из файла JSON и теги'
+    default_ingredients = os.path.join(
+        settings.BASE_DIR, 'data', 'ingredients.json')
@@ -0,0 +1,313 @@
+# Пакетная загрузка рецептов в БД из файлов JSON Lines или CSV
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import bump_version, table_version_name
+from api.images import save_thumbnails
+from api.indexes import ingredient_recipe_index
+from recipes.constants import RECIPE_THUMBNAIL_WIDTHS
+from recipes.images import process_image_file
+from recipes.loaders import batches, iter_file, load_ingredients
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+
+User = get_user_model()
+
+CHUNK_SIZE = 500
+
+
+def parse_csv_record(row):
+    """
+    Приводит строку CSV к виду записи JSON Lines.
+
+    Теги перечисляются через ';'. Ингредиенты остаются строкой
+    и разбираются при проверке записи, см. parse_csv_ingredients.
+    """
+    row = dict(row)
+    row['tags'] = [slug for slug in (row.get('tags') or '').split(';')
+                   if slug.strip()]
+    return row
+
+
+def parse_csv_ingredients(value):
+    """
+    Разбирает ингредиенты из CSV: через ';'
+    в виде 'название|единица|количество'.
+    """
+    ingredients = []
+    for item in value.split(';'):
+        if item.strip():
+            parts = item.rsplit('|', 2)
+            if len(parts) != 3:
+                raise ValueError(f'некорректный ингредиент {item!r}')
+            name, unit, amount = parts
+            ingredients.append(
+                {'name': name, 'measurement_unit': unit, 'amount': amount})
+    return ingredients
+
+
+def record_name(record):
+    """Название рецепта из записи или пустая строка."""
+    name = record.get('name')
+    return name.strip() if isinstance(name, str) else ''
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует рецепты из файла JSON Lines или CSV. Запись: name, '
+        'text, cooking_time, author (username), tags (слаги), ingredients '
+        '(name, measurement_unit, amount) и image (путь к файлу).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл рецептов (.jsonl или .csv)')
+        parser.add_argument(
+            '--images-dir',
+            help='Каталог для относительных путей изображений '
+                 '(по умолчанию - каталог файла рецептов)')
+        parser.add_argument(
+            '--author',
+            help='Username автора для записей без author')
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Число рецептов в одной транзакции')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов обработки изображений')
+
+    def handle(self, *args, **options):
+        """
+        Обрабатывает команду импорта рецептов.
+
+        Записи читаются потоком и обрабатываются порциями: изображения
+        порции нормализуются и уменьшаются до миниатюр в пуле
+        процессов, пока в БД вставляется предыдущая порция; рецепты,
+        ингредиенты и теги порции вставляются пачками в одной
+        транзакции. Рецепты с уже существующим названием пропускаются,
+        поэтому повторный запуск ничего не меняет.
+        """
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл не найден: {path}')
+        self.images_dir = options['images_dir'] or os.path.dirname(path)
+        self.default_author = options['author']
+        self.verbosity = options['verbosity']
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        }
+        self.authors = {}
+        # Названия, уже принятые к вставке за время работы команды:
+        # порция готовится до того, как предыдущая записана в БД.
+        self.names = set()
+        self.imported = self.skipped = self.existing = 0
+        self.ingredients_added = False
+
+        records = iter_file(path)
+        if not path.endswith(('.jsonl', '.ndjson')):
+            records = map(parse_csv_record, records)
+
+        started = time.monotonic()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            pending = None
+            for chunk in batches(records, options['chunk_size']):
+                chunk = self.prepare(chunk)
+                images = [
+                    pool.submit(process_image_file, record['image'],
+                                RECIPE_THUMBNAIL_WIDTHS)
+                    if record['image'] else None
+                    for record in chunk
+                ]
+                if pending:
+                    self.save(*pending)
+                pending = chunk, images
+            if pending:
+                self.save(*pending)
+
+        # Вставка пачками не отправляет сигналы, версии меняем явно.
+        models = [Recipe, IngredientRecipe, Recipe.tags.through]
+        if self.ingredients_added:
+            models.append(Ingredient)
+        for model in models:
+            bump_version(table_version_name(model._meta.db_table))
+        ingredient_recipe_index.invalidate()
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецепты: добавлено {self.imported}, уже были {self.existing}, '
+            f'пропущено с ошибками {self.skipped} за {elapsed:.2f} с '
+            f'({self.imported / elapsed * 60:.0f} рецептов/мин)'
+        ))
+
+    def prepare(self, chunk):
+        """
+        Проверяет записи порции и разрешает авторов, теги и ингредиенты.
+
+        Возвращает записи, готовые к вставке: рецепты с уже
+        существующими в БД названиями отбрасываются, ошибочные записи
+        и повторы названий из предыдущих записей файла пропускаются
+        с предупреждением. Недостающие ингредиенты создаются.
+        """
+        existing = set(Recipe.objects.filter(
+            name__in={record_name(record) for record in chunk} - self.names
+        ).values_list('name', flat=True))
+        new = [record for record in chunk
+               if record_name(record) not in existing]
+        self.existing += len(chunk) - len(new)
+        chunk = new
+        usernames = {
+            record.get('author') or self.default_author for record in chunk
+        } - set(self.authors)
+        self.authors.update(User.objects.filter(
+            username__in=usernames).values_list('username', 'id'))
+        prepared = []
+        for record in chunk:
+            try:
+                prepared.append(self.prepare_record(record))
+            except (AttributeError, KeyError, TypeError, ValueError) as error:
+                self.skip(record, error)
+
+        missing = {
+            key for record in prepared for key in record['ingredients']
+        } - set(self.ingredients)
+        if missing:
+            load_ingredients(
+                {'name': name, 'measurement_unit': unit}
+                for name, unit in missing)
+            self.ingredients.update(
+                ((name, unit), pk) for pk, name, unit in
+                Ingredient.objects.filter(
+                    name__in={name for name, _ in missing}
+                ).values_list('id', 'name', 'measurement_unit'))
+            self.ingredients_added = True
+
+        resolved = []
+        for record in prepared:
+            try:
+                ingredients = {}
+                for key, amount in record['ingredients'].items():
+                    pk = self.ingredients[key]
+                    ingredients[pk] = ingredients.get(pk, 0) + amount
+            except KeyError as error:
+                self.skip(record, f'нет ингредиента {error}')
+                continue
+            record['ingredients'] = ingredients
+            resolved.append(record)
+        return resolved
+
+    def skip(self, record, error):
+        """Пропускает ошибочную запись с предупреждением."""
+        self.skipped += 1
+        name = record.get('name') if isinstance(record, dict) else None
+        self.stderr.write(self.style.WARNING(
+            f'Рецепт пропущен: {name!r}: {error}'))
+
+    def prepare_record(self, record):
+        """
+        Возвращает проверенную запись рецепта.
+
+        Ингредиенты возвращаются в виде {(название, единица): количество},
+        id ингредиентов подставляет prepare.
+        """
+        name = record_name(record)
+        if not name or name in self.names:
+            raise ValueError('пустое или повторяющееся название')
+        cooking_time = int(record['cooking_time'])
+        if cooking_time < 1:
+            raise ValueError('время приготовления меньше минуты')
+        author = record.get('author') or self.default_author
+        if author not in self.authors:
+            raise ValueError(f'нет пользователя {author!r}')
+        items = record['ingredients']
+        if isinstance(items, str):
+            items = parse_csv_ingredients(items)
+        ingredients = {}
+        for item in items:
+            key = tuple(
+                value.strip() if isinstance(value, str) else ''
+                for value in (item.get('name'), item.get('measurement_unit')))
+            if not all(key):
+                raise ValueError('нет названия или единицы ингредиента')
+            amount = int(item['amount'])
+            if amount < 1:
+                raise ValueError('количество ингредиента меньше 1')
+            ingredients[key] = ingredients.get(key, 0) + amount
+        if not ingredients:
+            raise ValueError('нет ингредиентов')
+        tag_ids = {self.tags[slug.strip()] for slug in record['tags']}
+        image = record.get('image')
+        if image:
+            image = os.path.join(self.images_dir, image)
+        self.names.add(name)
+        return {
+            'name': name,
+            'text': record.get('text') or '',
+            'cooking_time': cooking_time,
+            'author_id': self.authors[author],
+            'tag_ids': tag_ids,
+            'ingredients': ingredients,
+            'image': image,
+        }
+
+    def save(self, chunk, images):
+        """Сохраняет изображения и вставляет порцию рецептов пачками."""
+        field = Recipe._meta.get_field('image')
+        recipes = []
+        for record, image in zip(chunk, images):
+            recipe = Recipe(
+                name=record['name'], text=record['text'],
+                cooking_time=record['cooking_time'],
+                author_id=record['author_id'])
+            if image is not None:
+                try:
+                    content, thumbnails = image.result()
+                except Exception as error:
+                    self.skipped += 1
+                    self.stderr.write(self.style.WARNING(
+                        f'Рецепт пропущен: {record["name"]!r}: '
+                        f'изображение {record["image"]}: {error}'))
+                    continue
+                recipe.image = field.storage.save(
+                    field.generate_filename(recipe, 'image.jpg'),
+                    ContentFile(content))
+                save_thumbnails(field.storage, recipe.image.name,
+                                RECIPE_THUMBNAIL_WIDTHS, thumbnails)
+            recipes.append((recipe, record))
+
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipe for recipe, _ in recipes)
+            self.set_missing_ids([recipe for recipe, _ in recipes])
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe_id=recipe.id,
+                                 ingredient_id=ingredient_id, amount=amount)
+                for recipe, record in recipes
+                for ingredient_id, amount in record['ingredients'].items()
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+                for recipe, record in recipes for tag_id in record['tag_ids']
+            )
+        self.imported += len(recipes)
+        if self.verbosity > 1:
+            self.stdout.write(f'Добавлено рецептов: {self.imported}')
+
+    def set_missing_ids(self, recipes):
+        """
+        Заполняет id рецептов, не возвращённые bulk_create.
+
+        PostgreSQL возвращает id вставленных строк, а на SQLite
+        они читаются по названиям, уникальным в пределах команды.
+        """
+        missing = {recipe.name: recipe for recipe in recipes
+                   if recipe.id is None}
+        if not missing:
+            return
+        for name, pk in Recipe.objects.filter(
+                name__in=missing).values_list('name', 'id'):
+            missing[name].id = pk
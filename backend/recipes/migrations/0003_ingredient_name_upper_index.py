@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEX_NAME = 'recipes_ingredient_name_upper_idx'
+
+
+def create_index(apps, schema_editor):
+    """Функциональный индекс для name__istartswith в PostgreSQL.
+
+    Django строит для istartswith условие UPPER(name::text) LIKE ...,
+    которое может использовать только индекс по этому же выражению
+    с классом операторов text_pattern_ops.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient '
+        '((UPPER(name::text)) text_pattern_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+POSTGRESQL_FORWARD = (
+    # Генерируемый столбец пересчитывается самой БД при каждой записи.
+    "ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX recipes_recipe_search_idx ON recipes_recipe "
+    "USING GIN (search_vector)",
+)
+POSTGRESQL_BACKWARD = (
+    "DROP INDEX IF EXISTS recipes_recipe_search_idx",
+    "ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector",
+)
+
+SQLITE_FORWARD = (
+    "CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5("
+    "name, text, content='recipes_recipe', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER recipes_recipe_fts_insert AFTER INSERT ON recipes_recipe "
+    "BEGIN "
+    "INSERT INTO recipes_recipe_fts(rowid, name, text) "
+    "VALUES (new.id, new.name, new.text); "
+    "END",
+    "CREATE TRIGGER recipes_recipe_fts_delete AFTER DELETE ON recipes_recipe "
+    "BEGIN "
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); "
+    "END",
+    "CREATE TRIGGER recipes_recipe_fts_update AFTER UPDATE ON recipes_recipe "
+    "BEGIN "
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); "
+    "INSERT INTO recipes_recipe_fts(rowid, name, text) "
+    "VALUES (new.id, new.name, new.text); "
+    "END",
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('rebuild')",
+)
+SQLITE_BACKWARD = (
+    "DROP TRIGGER IF EXISTS recipes_recipe_fts_insert",
+    "DROP TRIGGER IF EXISTS recipes_recipe_fts_delete",
+    "DROP TRIGGER IF EXISTS recipes_recipe_fts_update",
+    "DROP TABLE IF EXISTS recipes_recipe_fts",
+)
+
+
+def run_for_vendor(statements):
+    """Выполняет SQL для текущей БД (PostgreSQL или SQLite).
+
+    Полнотекстовый индекс не описан в модели: на PostgreSQL это
+    генерируемый столбец search_vector с GIN-индексом, на SQLite -
+    таблица FTS5 с триггерами. Поэтому миграции, изменяющие столбцы
+    name и text модели Recipe, должны пересоздавать этот индекс.
+    """
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql, params=None)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_ingredient_name_upper_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRESQL_FORWARD,
+                            'sqlite': SQLITE_FORWARD}),
+            run_for_vendor({'postgresql': POSTGRESQL_BACKWARD,
+                            'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
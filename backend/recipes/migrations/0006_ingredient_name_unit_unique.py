@@ -0,0 +1,55 @@
+# Generated by Django 3.2.3 on 2026-10-17 07:43
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Сливает ингредиенты с одинаковыми названием и единицей измерения
+    в запись с наименьшим id, складывая количества в рецептах
+    и списках покупок.
+    """
+    db = schema_editor.connection.alias
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    duplicates = Ingredient.objects.using(db).values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        keep_id = group['keep_id']
+        merged_ids = list(Ingredient.objects.using(db).filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=keep_id).values_list('id', flat=True))
+        for model_name, owner in (('IngredientRecipe', 'recipe_id'),
+                                  ('ShoppingListItem', 'user_id')):
+            model = apps.get_model('recipes', model_name)
+            rows = model.objects.using(db).filter(
+                ingredient_id__in=merged_ids + [keep_id])
+            kept = {}
+            for row in rows.order_by('-ingredient_id'):
+                owner_id = getattr(row, owner)
+                if owner_id in kept:
+                    kept[owner_id].amount += row.amount
+                    row.delete()
+                else:
+                    kept[owner_id] = row
+            for row in kept.values():
+                row.ingredient_id = keep_id
+                row.save()
+        Ingredient.objects.using(db).filter(id__in=merged_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shopping_list_item'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_unit'),
+        ),
+    ]
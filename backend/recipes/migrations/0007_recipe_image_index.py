@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Индекс по имени файла изображения рецепта.
+
+    Добавляется через AddIndex, а не AlterField(db_index=True):
+    на SQLite AlterField пересоздаёт таблицу recipes_recipe,
+    и вместе с ней пропадают триггеры FTS5 из миграции 0004.
+    """
+
+    dependencies = [
+        ('recipes', '0006_ingredient_name_unit_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=('image',),
+                               name='recipes_recipe_image_idx'),
+        ),
+    ]
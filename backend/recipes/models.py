@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth import get_user_model
 from recipes.constants import MAX_SPLIT_LENGTH, MAX_LENGTH_NAME
 from recipes.validators import real_amount, actual_cooking_time
@@ -39,6 +40,10 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингредиенты"
+        constraints = (
+            models.UniqueConstraint(fields=('name', 'measurement_unit'),
+                                    name='unique_ingredient_name_unit'),
+        )
 
     def __str__(self):
         return self.name[:MAX_SPLIT_LENGTH]
@@ -67,6 +72,26 @@ class Tag(models.Model):
         return self.name[:MAX_SPLIT_LENGTH]
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов с флагами текущего пользователя."""
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует рецепты флагами is_favorited и is_in_shopping_cart.
+
+        Для анонимного пользователя набор запросов возвращается без
+        изменений: флаги в этом случае всегда ложны.
+        """
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=models.Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+        )
+
+
 class Recipe(BaseEntity):
     """Модель рецепта, содержащая название,
        описание, ингредиенты, теги и другую информацию."""
@@ -86,11 +111,18 @@ class Recipe(BaseEntity):
     pub_date = models.DateTimeField('Дата и время публикации',
                                     auto_now_add=True)
 
+    objects = RecipeQuerySet.as_manager()
+
     class Meta(BaseEntity.Meta):
         ordering = ('-pub_date', 'name')
         default_related_name = 'recipes'
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
+        # Индекс описан в Meta, а не через db_index: AlterField
+        # на SQLite пересоздаёт таблицу и удаляет триггеры FTS5.
+        indexes = (
+            models.Index(fields=('image',), name='recipes_recipe_image_idx'),
+        )
 
 
 class TagRecipe(models.Model):
@@ -147,6 +179,56 @@ class IngredientRecipe(models.Model):
         )
 
 
+class UserRecipeQuerySet(models.QuerySet):
+    """
+    Набор запросов связей пользователей с рецептами.
+
+    Связь добавляется одним INSERT ... ON CONFLICT DO NOTHING
+    и удаляется одним DELETE; изменилась ли она, определяется
+    по числу затронутых строк, поэтому одновременные запросы
+    не создают дубликатов и не удаляют связь дважды. Вместо
+    save() и delete() отправляются сигналы post_save и post_delete,
+    и их обработчики выполняются в той же транзакции.
+    """
+
+    def add(self, user_id, recipe_id):
+        """Добавляет связь; возвращает False, если она уже была."""
+        with transaction.atomic(using=self.db):
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {self.model._meta.db_table} '
+                    '(user_id, recipe_id) VALUES (%s, %s) '
+                    'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+                    [user_id, recipe_id]
+                )
+                if cursor.rowcount != 1:
+                    return False
+            post_save.send(
+                sender=self.model,
+                instance=self.model(user_id=user_id, recipe_id=recipe_id),
+                created=True, update_fields=None, raw=False, using=self.db
+            )
+        return True
+
+    def remove(self, user_id, recipe_id):
+        """Удаляет связь; возвращает False, если её не было."""
+        with transaction.atomic(using=self.db):
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {self.model._meta.db_table} '
+                    'WHERE user_id = %s AND recipe_id = %s',
+                    [user_id, recipe_id]
+                )
+                if cursor.rowcount != 1:
+                    return False
+            post_delete.send(
+                sender=self.model,
+                instance=self.model(user_id=user_id, recipe_id=recipe_id),
+                using=self.db
+            )
+        return True
+
+
 class UserReciperelations(models.Model):
     """Модель для связывания пользователей с рецептами
        (например, в списках избранного или покупок).
@@ -159,6 +241,8 @@ class UserReciperelations(models.Model):
                                on_delete=models.CASCADE,
                                )
 
+    objects = UserRecipeQuerySet.as_manager()
+
     class Meta:
         abstract = True
         constraints = (
@@ -200,3 +284,132 @@ class ShoppingCart(UserReciperelations):
 
     def __str__(self):
         return f'{self.recipe.name} в корзине у {self.user.username}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """
+    Набор запросов итогов списка покупок.
+
+    Итоги меняются отдельными SQL-запросами без создания моделей:
+    при добавлении и удалении рецепта из корзины - на количества
+    ингредиентов этого рецепта, при изменении состава рецепта -
+    пересчётом списков затронутых пользователей.
+    """
+
+    def add_recipe(self, user_id, recipe_id):
+        """Прибавляет ингредиенты рецепта к списку пользователя."""
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                '(user_id, ingredient_id, amount) '
+                'SELECT %s, ingredient_id, amount '
+                f'FROM {IngredientRecipe._meta.db_table} '
+                'WHERE recipe_id = %s '
+                'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                f'SET amount = {self.model._meta.db_table}.amount '
+                '+ excluded.amount',
+                [user_id, recipe_id]
+            )
+
+    def remove_recipe(self, user_id, recipe_id):
+        """
+        Вычитает ингредиенты рецепта из списка пользователя.
+
+        Строки, количество в которых обнуляется, удаляются.
+        """
+        table = self.model._meta.db_table
+        ingredients = (
+            f'(SELECT ingredient_id, amount '
+            f'FROM {IngredientRecipe._meta.db_table} WHERE recipe_id = %s) '
+            'recipe_ingredient'
+        )
+        same_ingredient = (
+            f'recipe_ingredient.ingredient_id = {table}.ingredient_id')
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE user_id = %s AND EXISTS ('
+                f'SELECT 1 FROM {ingredients} WHERE {same_ingredient} '
+                f'AND recipe_ingredient.amount >= {table}.amount)',
+                [user_id, recipe_id]
+            )
+            cursor.execute(
+                f'UPDATE {table} SET amount = amount - ('
+                f'SELECT recipe_ingredient.amount FROM {ingredients} '
+                f'WHERE {same_ingredient}) WHERE user_id = %s AND '
+                f'ingredient_id IN (SELECT ingredient_id FROM {ingredients})',
+                [recipe_id, user_id, recipe_id]
+            )
+
+    def rebuild_for_recipe(self, recipe_id):
+        """Пересчитывает списки пользователей, у которых рецепт в корзине."""
+        self.rebuild(ShoppingCart.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True))
+
+    def rebuild(self, user_ids):
+        """Пересчитывает списки пользователей по их корзинам."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        table = self.model._meta.db_table
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE user_id IN ({placeholders})',
+                user_ids
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                'SELECT cart.user_id, recipe_ingredient.ingredient_id, '
+                'SUM(recipe_ingredient.amount) '
+                f'FROM {ShoppingCart._meta.db_table} cart '
+                f'JOIN {IngredientRecipe._meta.db_table} recipe_ingredient '
+                'ON recipe_ingredient.recipe_id = cart.recipe_id '
+                f'WHERE cart.user_id IN ({placeholders}) '
+                'GROUP BY cart.user_id, recipe_ingredient.ingredient_id',
+                user_ids
+            )
+
+    def for_user(self, user):
+        """
+        Выдаёт итоги списка пользователя, упорядоченные по названию.
+
+        Строки читаются из БД по мере обхода, без загрузки всего списка.
+        """
+        return (
+            {'name': name, 'measurement_unit': unit, 'amount': amount}
+            for name, unit, amount in self.filter(user=user).order_by(
+                'ingredient__name'
+            ).values_list('ingredient__name', 'ingredient__measurement_unit',
+                          'amount').iterator()
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя.
+
+    Поддерживается в актуальном состоянии сигналами корзины
+    и состава рецептов (см. ShoppingListQuerySet).
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, related_name='+',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'ingredient'),
+                                    name='unique_shopping_list_item'),
+        )
+
+    def __str__(self):
+        return (f'{self.ingredient.name}: {self.amount} '
+                f'в списке у {self.user.username}')
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib.auth import get_user_model
+from recipes.images import thumbnail_name
+from users.constants import AVATAR_THUMBNAIL_WIDTHS
 from users.models import Subscribtion
 
 User = get_user_model()
@@ -63,9 +65,11 @@ class UserAdmin(DisplayModelAdmin):
     def preview_avatar(self, obj):
         """Отображает миниатюру аватара пользователя в админке."""
         if obj.avatar:
+            url = obj.avatar.storage.url(thumbnail_name(
+                obj.avatar.name, AVATAR_THUMBNAIL_WIDTHS[0], 'jpg'))
             return format_html('''
                 <img src="{}" style="max-width: 100px; max-height: 100px;"/>
-                               '''.format(obj.avatar.url))
+                               '''.format(url))
 
         return 'Нет изображения'
     # Название столбца
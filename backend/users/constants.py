@@ -15,3 +15,5 @@ MAX_LENGTH_USERNAME = 150
 MAX_LENGTH_F_NAME = 150
 # Максимальная длина строки LAST_NAME
 MAX_LENGTH_L_NAME = 150
+# Ширины миниатюр аватара, пикселей
+AVATAR_THUMBNAIL_WIDTHS = (100, 200)
@@ -49,6 +49,9 @@ class User(AbstractUser):
         ordering = ('username',)
         verbose_name = 'пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = (
+            models.Index(fields=('avatar',), name='users_user_avatar_idx'),
+        )
 
     def __str__(self):
         return self.username